@@ -1,7 +1,14 @@
 import google.generativeai as genai
 import os
+import argparse
 from dotenv import load_dotenv
 
+from src.model_catalog import cached_list_models
+
+parser = argparse.ArgumentParser(description="List Gemini models that support content generation.")
+parser.add_argument("--refresh", action="store_true", help="Ignore the cached model catalog")
+args = parser.parse_args()
+
 load_dotenv()
 api_key = os.environ.get("GEMINI_API_KEY")
 
@@ -14,9 +21,9 @@ genai.configure(api_key=api_key)
 print("Searching for available Gemini models...")
 try:
     count = 0
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            print(f"- {m.name} ({m.display_name})")
+    for m in cached_list_models(refresh=args.refresh):
+        if 'generateContent' in m["methods"]:
+            print(f"- {m['name']} ({m['display_name']})")
             count += 1
     print(f"\nFound {count} models capable of content generation.")
 except Exception as e:
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import google.generativeai as genai
 from dotenv import load_dotenv
 from pathlib import Path
@@ -16,14 +17,25 @@ models = [
     'gemini-2.0-flash'
 ]
 
-print(f"Testing connectivity and quotas for {len(models)} models...\n")
+# Cap concurrent probes so we don't trip rate limits ourselves
+MAX_CONCURRENT_PROBES = 8
+
+async def probe(model_name: str, sem: asyncio.Semaphore) -> str:
+    async with sem:
+        try:
+            model = genai.GenerativeModel(model_name)
+            response = await model.generate_content_async("Say 'OK'")
+            return f"  [SUCCESS] {model_name}: {response.text.strip()}"
+        except Exception as e:
+            return f"  [FAILED]  {model_name}: {str(e)[:100]}"
 
-for m in models:
-    try:
+async def main():
+    sem = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+    results = await asyncio.gather(*[probe(m, sem) for m in models])
+    for m, line in zip(models, results):
         print(f"Testing {m}...")
-        model = genai.GenerativeModel(m)
-        response = model.generate_content("Say 'OK'")
-        print(f"  [SUCCESS] {m}: {response.text.strip()}")
-    except Exception as e:
-        print(f"  [FAILED]  {m}: {str(e)[:100]}")
-    print("-" * 40)
+        print(line)
+        print("-" * 40)
+
+print(f"Testing connectivity and quotas for {len(models)} models...\n")
+asyncio.run(main())
@@ -1,8 +1,16 @@
 import os
+import asyncio
+import argparse
 import google.generativeai as genai
 from dotenv import load_dotenv
 from pathlib import Path
 
+from src.model_catalog import cached_list_models
+
+parser = argparse.ArgumentParser(description="Probe every Gemini model available to this key.")
+parser.add_argument("--refresh", action="store_true", help="Ignore the cached model catalog")
+args = parser.parse_args()
+
 # Load environment
 env_path = Path('.') / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -14,34 +22,45 @@ if not api_key:
 
 genai.configure(api_key=api_key)
 
+# Cap concurrent probes so we don't trip rate limits ourselves
+MAX_CONCURRENT_PROBES = 8
+
+async def probe(model_id: str, sem: asyncio.Semaphore) -> str:
+    async with sem:
+        try:
+            model = genai.GenerativeModel(model_id)
+            # Use a very tiny prompt to test quota
+            response = await model.generate_content_async("ping", generation_config={"max_output_tokens": 5})
+            return f"SUCCESS: {response.text.strip()}"
+        except Exception as e:
+            err_str = str(e)
+            if "429" in err_str:
+                return "FAILED: Quota Exceeded (429)"
+            elif "403" in err_str:
+                return "FAILED: Permission Denied (403)"
+            elif "404" in err_str:
+                return "FAILED: Not Found (404)"
+            else:
+                # Catch other errors briefly
+                return f"FAILED: {err_str[:50]}..."
+
+async def probe_all(model_ids):
+    sem = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+    return await asyncio.gather(*[probe(m, sem) for m in model_ids])
+
 print(f"--- Checking Gemini Models for Key: {api_key[:10]}... ---")
 
 try:
     # List all available models for this key
-    available_models = genai.list_models()
-    
-    for m in available_models:
-        # We only care about models that support generating content
-        if 'generateContent' in m.supported_generation_methods:
-            model_id = m.name
-            # Skip non-vision/non-text models if necessary, but for now let's check all
-            try:
-                print(f"Testing {model_id}...", end=" ", flush=True)
-                model = genai.GenerativeModel(model_id)
-                # Use a very tiny prompt to test quota
-                response = model.generate_content("ping", generation_config={"max_output_tokens": 5})
-                print(f"SUCCESS: {response.text.strip()}")
-            except Exception as e:
-                err_str = str(e)
-                if "429" in err_str:
-                    print("FAILED: Quota Exceeded (429)")
-                elif "403" in err_str:
-                    print("FAILED: Permission Denied (403)")
-                elif "404" in err_str:
-                    print("FAILED: Not Found (404)")
-                else:
-                    # Catch other errors briefly
-                    print(f"FAILED: {err_str[:50]}...")
+    # We only care about models that support generating content
+    model_ids = [
+        m["name"] for m in cached_list_models(refresh=args.refresh)
+        if 'generateContent' in m["methods"]
+    ]
+    # Skip non-vision/non-text models if necessary, but for now let's check all
+    results = asyncio.run(probe_all(model_ids))
+    for model_id, result in zip(model_ids, results):
+        print(f"Testing {model_id}... {result}")
 
 except Exception as e:
     print(f"Fatal error listing models: {e}")
@@ -1,26 +1,164 @@
 import os
+import asyncio
 import cv2
-import json
+import hashlib
 import logging
+import threading
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 
 # New MAS Import
 from src.multi_agent_system import MultiAgentOrchestrator
-from src.video_processor import load_video
+from src.video_processor import LazyFrameSource
 from src.overlay import create_overlay_engine
+from src.llm_cache import FileCache, ResponseCache
+from src import json_codec
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Finished analyses are replayed from disk for this long (VAR reviews repeat the same incident)
+ANALYSIS_CACHE_TTL = float(os.environ.get("ANALYSIS_CACHE_TTL", 24 * 3600))
+# Opt-in motion pre-filter for which frames fill the 3-frame budget; it decodes
+# the whole clip up front, where the default path only seeks to 3 frames
+MOTION_PREFILTER = os.environ.get("MOTION_PREFILTER", "").lower() in ("1", "true", "yes")
+# Kept outside the output directory, which the dashboard serves publicly as /output
+ANALYSIS_CACHE_DIR = Path(os.environ.get("ANALYSIS_CACHE_DIR", Path.home() / ".offside-zero" / "analysis"))
+
+def _video_digest(video_path: str, sample_bytes: int = 1 << 20) -> str:
+    """Cheap content key: sha256 over file size plus the first and last `sample_bytes`."""
+    size = os.path.getsize(video_path)
+    h = hashlib.sha256(str(size).encode())
+    with open(video_path, "rb") as f:
+        h.update(f.read(sample_bytes))
+        if size > sample_bytes:
+            f.seek(max(size - sample_bytes, sample_bytes))
+            h.update(f.read(sample_bytes))
+    return h.hexdigest()
+
+def _annotate_rgb_frames(overlay_engine, frames_rgb: List, analysis: Dict[str, Any]) -> List:
+    """Convert decoded RGB frames to BGR and draw the verdict on all of them."""
+    # (Current logic maps best data to final result, we might need per-frame mapping later)
+    return overlay_engine.create_annotated_frames(
+        [cv2.cvtColor(f, cv2.COLOR_RGB2BGR) for f in frames_rgb], analysis
+    )
+
+def _write_jpeg(out_path: str, frame_bgr):
+    cv2.imwrite(out_path, frame_bgr, [cv2.IMWRITE_JPEG_QUALITY, 85])
+
 class AnalysisService:
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", cache_dir: Optional[str] = None):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
+        self._out = Path(output_dir)
+        # Finished analyses keyed by (video content, timestamp, model)
+        self.cache_dir = Path(cache_dir) if cache_dir else ANALYSIS_CACHE_DIR
+        self.cache = ResponseCache(FileCache(self.cache_dir, ttl=ANALYSIS_CACHE_TTL))
         # Initialize MAS Orchestrator
         self.orchestrator = MultiAgentOrchestrator()
 
+    def _cache_key(self, video_path: str, timestamp: Optional[float], model_name: Optional[str]) -> str:
+        # Keying on the effective model invalidates entries when GEMINI_MODEL changes
+        model = (model_name or os.environ.get("GEMINI_MODEL") or "default").replace("/", "_")
+        ts = "full" if timestamp is None else f"{timestamp:g}"
+        return f"{_video_digest(video_path)}_{ts}_{model}"
+
+    def _output_base(self, video_path: str, cache_key: str) -> str:
+        """
+        File-name prefix for an analysis's outputs. Tagged with the cache key so analyses of the
+        same clip at another timestamp/model (or another clip with the same name) never overwrite
+        the images a cached verdict points at.
+        """
+        tag = hashlib.sha256(cache_key.encode()).hexdigest()[:12]
+        return f"{Path(video_path).stem}_{tag}"
+
+    def _load_cached(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.cache.get(key)
+        if result is None:
+            return None
+        # Outputs may have been cleaned up since; re-run rather than point at missing images
+        if not all((self._out / p).exists() for p in result.get("annotated_frames", [])):
+            logger.info(f"Cache entry {key} has missing outputs; re-running")
+            return None
+        logger.info(f"Cache hit: {key}")
+        return result
+
+    def _open_frames(self, video_path: str, timestamp: Optional[float]):
+        """
+        Pick the keyframes for analysis and decode them into a LazyFrameSource.
+        Returns (info, source); the caller owns and closes the source.
+        """
+        source = LazyFrameSource(video_path)
+        try:
+            video = source.video
+            info = video.get_info()
+            
+            # For MAS, we want high quality keyframes
+            if timestamp is not None:
+                indices = video.indices_around(timestamp, window_seconds=1.0, num_frames=3)
+            else:
+                # Evenly spaced frames, or with MOTION_PREFILTER the strongest motion
+                # spikes topped up with them (all 3 for a static clip)
+                total = info['frame_count']
+                quartiles = [total // 4, total // 2, (total * 3) // 4]
+                indices = video.candidate_critical_frames(max_candidates=3) if MOTION_PREFILTER else []
+                indices = sorted(indices + [i for i in quartiles if i not in indices][:3 - len(indices)])
+            
+            source.indices = [i for i in indices if 0 <= i < info['frame_count']]
+            source.prefetch()
+        except Exception:
+            source.close()
+            raise
+        return info, source
+
+    def _save_analysis_json(self, base_name: str, analysis: Dict[str, Any]):
+        json_path = self._out / f"{base_name}_swarm_analysis.json"
+        with open(json_path, "wb") as f:
+            f.write(json_codec.dumpb(analysis, indent=True))
+
+    def _write_outputs(
+        self,
+        base_name: str,
+        info: Dict[str, Any],
+        frames: List,
+        analysis: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Annotate frames and persist the analysis JSON next to them."""
+        # We'll annotate the frames based on the result
+        overlay_engine = create_overlay_engine(info['width'], info['height'])
+        annotated_paths = [f"{base_name}_swarm_{i}.jpg" for i in range(len(frames))]
+        
+        annotated = _annotate_rgb_frames(overlay_engine, frames, analysis)
+        for frame, out_filename in zip(annotated, annotated_paths):
+            _write_jpeg(str(self._out / out_filename), frame)
+        
+        analysis["annotated_frames"] = annotated_paths
+        self._save_analysis_json(base_name, analysis)
+        return analysis
+
+    async def _awrite_outputs(
+        self,
+        base_name: str,
+        info: Dict[str, Any],
+        frames: List,
+        analysis: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """`_write_outputs` with every frame encoded on its own worker thread."""
+        overlay_engine = create_overlay_engine(info['width'], info['height'])
+        annotated_paths = [f"{base_name}_swarm_{i}.jpg" for i in range(len(frames))]
+        
+        annotated = await asyncio.to_thread(_annotate_rgb_frames, overlay_engine, frames, analysis)
+        # cv2 releases the GIL while encoding, so the frames really do run in parallel
+        await asyncio.gather(*[
+            asyncio.to_thread(_write_jpeg, str(self._out / out_filename), frame)
+            for frame, out_filename in zip(annotated, annotated_paths)
+        ])
+        
+        analysis["annotated_frames"] = annotated_paths
+        await asyncio.to_thread(self._save_analysis_json, base_name, analysis)
+        return analysis
+
     def analyze_clip(
         self,
         video_path: str,
@@ -36,66 +174,83 @@ class AnalysisService:
              return {"error": f"Video not found: {video_path}"}
 
         try:
-            with load_video(video_path) as video:
-                info = video.get_info()
-                
-                # 1. Extract Frames
-                # For MAS, we want high quality keyframes
-                if timestamp is not None:
-                    frames = video.extract_frames_around(timestamp, window_seconds=1.0, num_frames=3)
-                else:
-                    # Select 3 evenly spaced frames for efficiency
-                    total = info['frame_count']
-                    indices = [total // 4, total // 2, (total * 3) // 4]
-                    frames = []
-                    for i in indices:
-                        frame = video.extract_frame(i)
-                        if frame is not None:
-                            frames.append(frame)
-                
-                if not frames:
+            cache_key = self._cache_key(video_path, timestamp, model_name)
+            cached = self._load_cached(cache_key)
+            if cached is not None:
+                return cached
+
+            # 1. Extract Frames
+            info, source = self._open_frames(video_path, timestamp)
+            with source:
+                if not len(source):
                     return {"error": "Could not extract frames"}
                 
-                pil_frames = video.frames_to_pil(frames)
-                
                 # 2. Orchestrate Swarm Analysis
                 logger.info("Dispatching to Agent Swarm...")
-                analysis = self.orchestrator.process_clip(pil_frames)
+                analysis = self.orchestrator.process_clip(source)
                 
-                # 3. Create Annotated Output (Simplified for now)
-                # We'll annotate the first frame based on the result
-                overlay_engine = create_overlay_engine(info['width'], info['height'])
-                annotated_paths = []
-                base_name = Path(video_path).stem
-                
-                for i, frame in enumerate(frames):
-                    # Only annotate if we have entity data
-                    # (Current logic maps best data to final result, we might need per-frame mapping later)
-                    frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    annotated = overlay_engine.create_annotated_frame(frame_bgr, analysis)
-                    
-                    out_filename = f"{base_name}_swarm_{i}.jpg"
-                    out_path = os.path.join(self.output_dir, out_filename)
-                    cv2.imwrite(out_path, annotated)
-                    annotated_paths.append(out_filename)
-                
-                analysis["annotated_frames"] = annotated_paths
+                # 3. Create Annotated Output
+                frames = [source.frame(i) for i in range(len(source))]
+            analysis = self._write_outputs(self._output_base(video_path, cache_key), info, frames, analysis)
+            if "error" not in analysis:
+                self.cache.set(cache_key, analysis)
+            return analysis
+
+        except Exception as e:
+            logger.error(f"Swarm Analysis failed: {e}", exc_info=True)
+            return {"error": str(e)}
+
+    async def aanalyze_clip(
+        self,
+        video_path: str,
+        timestamp: Optional[float] = None,
+        model_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Event-loop friendly variant of `analyze_clip`.
+        Swarm calls are awaited directly; decoding and annotation run in
+        worker threads so concurrent analyses overlap while Gemini I/O is pending.
+        
+        Callers are expected to have validated `video_path` already (the
+        dashboard does so at submit time, the CLI before dispatch).
+        """
+        logger.info(f"Starting SWARM analysis for: {video_path}")
+
+        try:
+            cache_key = await asyncio.to_thread(self._cache_key, video_path, timestamp, model_name)
+            cached = self._load_cached(cache_key)
+            if cached is not None:
+                return cached
+
+            info, source = await asyncio.to_thread(self._open_frames, video_path, timestamp)
+            try:
+                if not len(source):
+                    return {"error": "Could not extract frames"}
                 
-                # Save JSON
-                json_path = os.path.join(self.output_dir, f"{base_name}_swarm_analysis.json")
-                with open(json_path, "w") as f:
-                    json.dump(analysis, f, indent=2)
+                logger.info("Dispatching to Agent Swarm...")
+                analysis = await self.orchestrator.aprocess_clip(source)
                 
-                return analysis
+                frames = await asyncio.to_thread(lambda: [source.frame(i) for i in range(len(source))])
+            finally:
+                source.close()
+            
+            analysis = await self._awrite_outputs(self._output_base(video_path, cache_key), info, frames, analysis)
+            if "error" not in analysis:
+                self.cache.set(cache_key, analysis)
+            return analysis
 
         except Exception as e:
             logger.error(f"Swarm Analysis failed: {e}", exc_info=True)
             return {"error": str(e)}
 
 _service_instance = None
+_service_lock = threading.Lock()
 
 def get_analysis_service(output_dir: str = "output"):
     global _service_instance
     if _service_instance is None:
-        _service_instance = AnalysisService(output_dir)
+        # Two early requests must not both build an orchestrator
+        with _service_lock:
+            if _service_instance is None:
+                _service_instance = AnalysisService(output_dir)
     return _service_instance
@@ -1,23 +1,24 @@
 import os
 import glob
 import uuid
+import collections
 import threading
-import queue
 import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Form, File, UploadFile
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
-from typing import List, Dict, Any
+import aiofiles
+from cachetools import TTLCache
+from typing import List, Dict, Any, Optional
 import asyncio
 
 # Import our core modules
 from src.analysis_service import get_analysis_service
 
-app = FastAPI(title="Offside Zero Dashboard")
-
 # Directories
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.dirname(BASE_DIR)
@@ -34,41 +35,99 @@ os.makedirs(STATIC_DIR, exist_ok=True)
 os.makedirs(TEMPLATES_DIR, exist_ok=True)
 os.makedirs(LIVE_BUFFER_DIR, exist_ok=True)
 
-# Mounts
-app.mount("/output", StaticFiles(directory=OUTPUT_DIR), name="output")
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+# Upload limits
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 500 * 1024 * 1024))
+MAX_FRAME_BYTES = 10 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1 << 20
 
-templates = Jinja2Templates(directory=TEMPLATES_DIR)
+async def save_upload(file: UploadFile, path: str, limit: int) -> bool:
+    """
+    Stream an upload to disk in fixed-size chunks so memory stays O(chunk).
+    Returns False if the upload exceeds `limit`; nothing is left at `path` in that case.
+    """
+    tmp_path = path + ".part"
+    written = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                written += len(chunk)
+                if written > limit:
+                    break
+                await out.write(chunk)
+        if written > limit:
+            return False
+        os.replace(tmp_path, path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# --- Live Feed ---
+# Latest ingested JPEG, kept in memory so viewers never touch the filesystem
+_latest_frame: bytes = b""
+_frame_event = asyncio.Event()
+
+# MJPEG part framing, sent around each frame rather than concatenated with it
+_MJPEG_HDR = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+_MJPEG_TR = b'\r\n'
+
+# Ring of buffered frame files on disk (keep buffer small - max 100 frames).
+# Seeded once from whatever a previous run left behind.
+LIVE_BUFFER_SIZE = 100
+_ring: collections.deque = collections.deque(maxlen=LIVE_BUFFER_SIZE)
+
+def _seed_live_ring():
+    existing = sorted(glob.glob(os.path.join(LIVE_BUFFER_DIR, "*.jpg")), key=os.path.getmtime)
+    for old_frame in existing[:-LIVE_BUFFER_SIZE]:
+        try:
+            os.remove(old_frame)
+        except OSError:
+            pass  # Ignore deletion errors
+    _ring.extend(existing[-LIVE_BUFFER_SIZE:])
+
+_seed_live_ring()
+
+def publish_frame(content: bytes):
+    """Make `content` the current live frame and wake every MJPEG viewer."""
+    global _latest_frame
+    _latest_frame = content
+    _frame_event.set()
+    _frame_event.clear()
 
 # --- Async Processing Setup ---
 # Simulating Cloud Pub/Sub and Firestore
-TASK_QUEUE = queue.Queue()
-TASKS: Dict[str, Dict[str, Any]] = {}
+TASK_QUEUE: asyncio.Queue = asyncio.Queue()
+# Bounded so finished tasks don't accumulate forever; entries expire after a day.
+# Only touched from the event loop, so TTLCache's lack of locking is fine.
+TASKS: Dict[str, Dict[str, Any]] = TTLCache(maxsize=10_000, ttl=24 * 3600)
+WORKERS = int(os.environ.get("ANALYSIS_WORKERS", 4))
+
+def resolve_clip(clip_name: str) -> Optional[str]:
+    """Map a submitted clip name to its path in CLIPS_DIR, or None if it doesn't exist."""
+    video_path = os.path.join(CLIPS_DIR, os.path.basename(clip_name))
+    return video_path if os.path.isfile(video_path) else None
 
-def worker():
+async def worker_loop(q: asyncio.Queue):
     """Background worker to process analysis tasks."""
-    print("Worker failed to start? No, it's running.")
     while True:
+        # Paths were validated by resolve_clip at submit time
+        task_id, clip_name, video_path = await q.get()
+        # Hold a reference: the entry may be evicted from TASKS while we work
+        task = TASKS.get(task_id)
+        if task is None:
+            task = TASKS[task_id] = {"clip_name": clip_name}
         try:
-            task_id, clip_name = TASK_QUEUE.get()
             print(f"Processing task {task_id} for {clip_name}")
             
-            TASKS[task_id]["status"] = "PROCESSING"
+            task["status"] = "PROCESSING"
             
-            video_path = os.path.join(CLIPS_DIR, clip_name)
-            if not os.path.exists(video_path):
-                 TASKS[task_id]["status"] = "FAILED"
-                 TASKS[task_id]["error"] = "Video not found"
-                 TASK_QUEUE.task_done()
-                 continue
-
             # Run Analysis
             service = get_analysis_service(OUTPUT_DIR)
-            result = service.analyze_clip(video_path)
+            result = await service.aanalyze_clip(video_path)
             
             if "error" in result:
-                TASKS[task_id]["status"] = "FAILED"
-                TASKS[task_id]["error"] = result["error"]
+                task["status"] = "FAILED"
+                task["error"] = result["error"]
             else:
                 # Fixup paths for web display
                 if "annotated_frames" in result:
@@ -76,18 +135,34 @@ def worker():
                 if "slowmo_video" in result:
                     result["slowmo_video"] = f"/output/{os.path.basename(result['slowmo_video'])}"
                 
-                TASKS[task_id]["status"] = "COMPLETED"
-                TASKS[task_id]["result"] = result
+                task["status"] = "COMPLETED"
+                task["result"] = result
             
             print(f"Task {task_id} completed.")
-            TASK_QUEUE.task_done()
             
         except Exception as e:
-            print(f"Worker crashed: {e}")
-            # In production, we'd want to restart the worker or handle this better
-            
-# Start worker thread
-threading.Thread(target=worker, daemon=True).start()
+            print(f"Task {task_id} crashed: {e}")
+            task["status"] = "FAILED"
+            task["error"] = str(e)
+        finally:
+            q.task_done()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the analysis workers on the server's event loop."""
+    workers = [asyncio.create_task(worker_loop(TASK_QUEUE)) for _ in range(WORKERS)]
+    yield
+    for w in workers:
+        w.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+app = FastAPI(title="Offside Zero Dashboard", lifespan=lifespan)
+
+# Mounts
+app.mount("/output", StaticFiles(directory=OUTPUT_DIR), name="output")
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 # --- Endpoints ---
 
@@ -100,13 +175,16 @@ async def read_root(request: Request):
 @app.post("/analyze")
 async def submit_analysis(clip_name: str = Form(...)):
     """Submit a clip for asynchronous analysis."""
+    video_path = resolve_clip(clip_name)
+    if video_path is None:
+        return JSONResponse({"error": "Video not found"}, status_code=404)
     task_id = str(uuid.uuid4())
     TASKS[task_id] = {
         "status": "PENDING",
         "clip_name": clip_name,
         "submitted_at": time.time()
     }
-    TASK_QUEUE.put((task_id, clip_name))
+    await TASK_QUEUE.put((task_id, clip_name, video_path))
     return {"task_id": task_id, "status": "PENDING"}
 
 @app.post("/upload")
@@ -120,48 +198,67 @@ async def upload_clip(file: UploadFile = File(...)):
              
         file_path = os.path.join(CLIPS_DIR, filename)
         
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        if not await save_upload(file, file_path, MAX_UPLOAD_BYTES):
+            return JSONResponse({"error": "File too large"}, status_code=413)
             
         return {"status": "uploaded", "filename": filename}
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+async def _store_frame(content: bytes, filename: str):
+    """Buffer one ingested frame on disk and publish it to live viewers."""
+    # Save frame to buffer (simulating live processing pipeline)
+    # In a real system, this would push to Pub/Sub or a streaming pipe
+    filepath = os.path.join(LIVE_BUFFER_DIR, filename)
+    async with aiofiles.open(filepath, "wb") as f:
+        await f.write(content)
+    publish_frame(content)
+
+    # Evict the oldest buffered frame once the ring is full
+    if len(_ring) == _ring.maxlen:
+        try:
+            os.remove(_ring[0])
+        except OSError:
+            pass  # Don't fail if cleanup fails
+    _ring.append(filepath)
+
 @app.post("/ingest")
 async def ingest_frame(file: UploadFile = File(...)):
     """Receive a live video frame."""
     try:
-        # Save frame to buffer (simulating live processing pipeline)
-        # In a real system, this would push to Pub/Sub or a streaming pipe
         timestamp = int(time.time() * 1000)
         filename = f"frame_{timestamp}.jpg"
-        filepath = os.path.join(LIVE_BUFFER_DIR, filename)
         
-        with open(filepath, "wb") as f:
-            content = await file.read()
-            f.write(content)
-            
-        # Cleanup old frames (keep buffer small - max 100 frames)
-        try:
-            all_frames = sorted(
-                glob.glob(os.path.join(LIVE_BUFFER_DIR, "*.jpg")),
-                key=os.path.getmtime
-            )
-            if len(all_frames) > 100:
-                # Delete oldest frames
-                for old_frame in all_frames[:-100]:
-                    try:
-                        os.remove(old_frame)
-                    except OSError:
-                        pass  # Ignore deletion errors
-        except Exception:
-            pass  # Don't fail if cleanup fails
+        # Frames are small and must stay in memory for the live feed anyway
+        content = await file.read(MAX_FRAME_BYTES + 1)
+        if len(content) > MAX_FRAME_BYTES:
+            return JSONResponse({"error": "Frame too large"}, status_code=413)
         
+        await _store_frame(content, filename)
         return {"status": "received", "file": filename}
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.post("/ingest_batch")
+async def ingest_batch(file: List[UploadFile] = File(...)):
+    """Receive several live frames in one request, stored and published in upload order."""
+    try:
+        timestamp = int(time.time() * 1000)
+        contents = []
+        for part in file:
+            content = await part.read(MAX_FRAME_BYTES + 1)
+            if len(content) > MAX_FRAME_BYTES:
+                return JSONResponse({"error": "Frame too large"}, status_code=413)
+            contents.append(content)
+        
+        # Frames in one batch share a millisecond, so the index keeps names unique
+        filenames = [f"frame_{timestamp}_{i:02d}.jpg" for i in range(len(contents))]
+        for content, filename in zip(contents, filenames):
+            await _store_frame(content, filename)
+        return {"status": "received", "files": filenames}
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
 import glob
 import asyncio
 from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
@@ -186,29 +283,39 @@ async def chat_endpoint(request: ChatRequest):
 
 @app.get("/live_feed")
 async def live_feed():
-    """Stream MJPEG feed from live buffer."""
-    def frame_generator():
+    """Stream MJPEG feed from the in-memory latest frame."""
+    async def frame_generator():
+        if _latest_frame:
+            yield _MJPEG_HDR
+            yield _latest_frame
+            yield _MJPEG_TR
         while True:
-            # Find latest frame in buffer
-            files = sorted(glob.glob(os.path.join(LIVE_BUFFER_DIR, "*.jpg")))
-            if files:
-                latest_frame = files[-1]
-                with open(latest_frame, "rb") as f:
-                    frame_data = f.read()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
-            time.sleep(0.05) # 20 FPS cap for viewer
+            # Wait for /ingest to publish a new frame instead of polling the buffer dir
+            await _frame_event.wait()
+            # Three sends avoid copying every frame into a fresh bytes object
+            yield _MJPEG_HDR
+            yield _latest_frame
+            yield _MJPEG_TR
+            await asyncio.sleep(0.05) # 20 FPS cap for viewer
 
     return StreamingResponse(frame_generator(), media_type="multipart/x-mixed-replace; boundary=frame")
 
 @app.post("/analyze_roi")
 async def analyze_roi(request: ROIRequest):
     """Analyze specific region of interest."""
+    video_path = resolve_clip(request.clip_name)
+    if video_path is None:
+        return JSONResponse({"error": "Video not found"}, status_code=404)
     # Add high priority task
     task_id = f"roi_{int(time.time())}"
     # In a real system, we'd pass the ROI points to the analyzer
     # For now, we'll re-analyze the whole clip but prioritize it
-    TASK_QUEUE.put((task_id, request.clip_name)) 
+    TASKS[task_id] = {
+        "status": "PENDING",
+        "clip_name": request.clip_name,
+        "submitted_at": time.time()
+    }
+    await TASK_QUEUE.put((task_id, request.clip_name, video_path))
     return {"task_id": task_id, "status": "ROI_ANALYZING"}
 
 @app.get("/status/{task_id}")
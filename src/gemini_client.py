@@ -1,12 +1,24 @@
+import io
 import os
+import asyncio
+import functools
 import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
 import json
+import msgspec
 from typing import List, Dict, Any, Optional
 from PIL import Image
 from dotenv import load_dotenv
 from pathlib import Path
 import logging
 
+from src.sync_runner import run_sync
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json is the fallback
+    orjson = None
+
 ## Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -15,30 +27,163 @@ logger = logging.getLogger(__name__)
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-def _load_fifa_rules():
-    """Load FIFA rules from various locations with fallback."""
+DEFAULT_FIFA_RULES = "Standard FIFA Offside and Handball rules apply."
+
+def _find_fifa_rules() -> Optional[str]:
+    """Locate the FIFA rules file from various locations."""
     # Check environment variable first
     env_path = os.environ.get("FIFA_RULES_PATH")
     if env_path and os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            return f.read()
+        return env_path
+
+    # Check project root, then data directory
+    for candidate in (
+        Path(__file__).parent.parent / "fifa_rules.md",
+        Path(__file__).parent.parent / "data" / "fifa_rules.md",
+    ):
+        if candidate.exists():
+            return str(candidate)
+
+    return None
+
+def _build_system_instruction(fifa_rules: str) -> str:
+    return f"""
+        You are an elite FIFA-certified VAR AI Assistant.
+        Your decisions must be based STRICTLY on the following FIFA Laws of the Game:
+        
+        {fifa_rules}
+        
+        CRITICAL: To prove your decision, you MUST provide geometric data.
+        1. Identify the 'offside_line_y' (normalized 0-1) where the last defender is positioned.
+        2. Identify key players (Attacker, Defender) with their 'box_2d' [ymin, xmin, ymax, xmax].
+        
+        Return JSON schema:
+        {{
+            "decision": "OFFSIDE" | "ONSIDE" | "HANDBALL" | "NO_INFRACTION" | "UNCLEAR",
+            "confidence": float,
+            "explanation": "string (cite specific Law 11/12 clauses)",
+            "visual_cues": "string (describe the geometry)",
+            "entities": [
+                {{"label": "Offside Line", "box_2d": [y, 0, y, 1]}}, 
+                {{"label": "Attacker"|"Defender"|"Ball", "box_2d": [ymin, xmin, ymax, xmax], "id": "string"}}
+            ]
+        }}
+        """
+
+@functools.lru_cache(maxsize=1)
+def _rules_for(path: Optional[str], mtime_ns: Optional[int]) -> tuple:
+    """Read the rules and build the system instruction for one file version."""
+    rules = DEFAULT_FIFA_RULES
+    if path:
+        with open(path, 'r') as f:
+            rules = f.read()
+    return rules, _build_system_instruction(rules)
+
+def _load_rules_entry() -> tuple:
+    # Keyed on mtime so an edited rules file is picked up on the next request
+    path = _find_fifa_rules()
+    try:
+        return _rules_for(path, os.stat(path).st_mtime_ns if path else None)
+    except OSError:
+        return _rules_for(None, None)
+
+def _get_rules() -> str:
+    """FIFA rules text; re-read only when the file's mtime changes."""
+    return _load_rules_entry()[0]
+
+def _get_system_instruction() -> str:
+    """VAR system instruction, rebuilt only when the FIFA rules change."""
+    return _load_rules_entry()[1]
+
+# Static prompt payloads, built once per process instead of per request
+_CHAT_HEADER = """
+        You are an elite FIFA-certified VAR AI Expert. 
+        You have just analyzed a football clip.
+        
+        Here is your previous analysis (Context):
+        """
+
+_CHAT_RULES = """
+        
+        The user is asking a follow-up question.
+        
+        CRITICAL RULES:
+        1. Verify the specific action (e.g., was it a header, a kick, a deflection?). Correct the user if they premise their question on the wrong action type.
+        2. Cite specific FIFA Laws (Law 11 Offside, Law 12 Handball).
+        3. Be concise, authoritative, and precise.
+        """
+
+_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    temperature=0.1, # Lower temperature for stricter rule adherence
+)
+
+def is_credential_error(exc: Exception) -> bool:
+    """
+    A bad or missing API key fails identically on every model, so no other candidate can win.
+    PermissionDenied is deliberately excluded: it is often per-model (e.g. a preview model the
+    key isn't enabled for) while another candidate would still succeed.
+    """
+    if isinstance(exc, api_exceptions.Unauthenticated):
+        return True
+    # Gemini reports a rejected key as 400 INVALID_ARGUMENT "API key not valid"
+    return isinstance(exc, api_exceptions.InvalidArgument) and "API key" in str(exc)
+
+# Gemini tiles/resizes images internally, so larger uploads only cost bandwidth and tokens
+_MAX_EDGE = int(os.environ.get("GEMINI_MAX_EDGE", 1024))
+
+def _downscale(image: Image.Image, max_edge: int = _MAX_EDGE) -> Image.Image:
+    """Shrink `image` so its long side is at most `max_edge` pixels."""
+    long_side = max(image.size)
+    if long_side <= max_edge:
+        return image
+    scale = max_edge / long_side
+    return image.resize((int(image.width * scale), int(image.height * scale)), Image.LANCZOS)
+
+def _pil_to_jpeg_bytes(image: Image.Image, quality: int = 85) -> bytes:
+    """Encode a frame to JPEG once so every model attempt can share the bytes."""
+    buf = io.BytesIO()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(buf, "JPEG", quality=quality, optimize=False)
+    return buf.getvalue()
+
+class AnalysisResult(msgspec.Struct):
+    """Shape of a VAR analysis response; decoded and validated in one pass."""
+    decision: str
+    confidence: float
+    explanation: str = ""
+    visual_cues: str = ""
+    offside_line_y: Optional[float] = None
+    entities: list = []
 
-    # Check project root
-    root_path = Path(__file__).parent.parent / "fifa_rules.md"
-    if root_path.exists():
-        with open(root_path, 'r') as f:
-            return f.read()
+def _api_error(last_exception: Optional[Exception]) -> Dict[str, Any]:
+    return {
+        "decision": "API_ERROR",
+        "confidence": 0.0,
+        "explanation": f"All models failed. Last error: {str(last_exception)}"
+    }
 
-    # Check data directory
-    data_path = Path(__file__).parent.parent / "data" / "fifa_rules.md"
-    if data_path.exists():
-        with open(data_path, 'r') as f:
-            return f.read()
+@functools.lru_cache(maxsize=16)
+def _get_model(model_name: str) -> genai.GenerativeModel:
+    """
+    Reuse model handles across calls instead of rebuilding them per request.
+    Handles keep their SDK client once used, so concurrent calls share its channel.
+    """
+    return genai.GenerativeModel(model_name)
 
-    # Fallback to default
-    return "Standard FIFA Offside and Handball rules apply."
+# genai.configure() throws away the SDK's cached API clients (and their open
+# channels), so only call it when the key actually changes.
+_configured_api_key = None
 
-FIFA_RULES = _load_fifa_rules()
+def _ensure_configured(api_key: Optional[str]):
+    global _configured_api_key
+    if api_key and api_key != _configured_api_key:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+        _get_model.cache_clear()  # handles may hold clients bound to the old key
+
+_ensure_configured(os.environ.get("GEMINI_API_KEY"))
 
 class GeminiClient:
     def __init__(self, model_name: str = None):
@@ -66,18 +211,17 @@ class GeminiClient:
             else:
                 self.models = default_models
 
-        if self.gemini_api_key:
-            genai.configure(api_key=self.gemini_api_key)
+        _ensure_configured(self.gemini_api_key)
+        # Resolve every fallback handle once so an attempt costs only its API call
+        self._models = {name: _get_model(name) for name in self.models}
 
-    def _analyze_with_gemini(self, model_name: str, full_prompt: list) -> dict:
-        """Call Gemini API."""
-        model = genai.GenerativeModel(model_name)
-        generation_config = genai.GenerationConfig(
-            response_mime_type="application/json",
-            temperature=0.1, # Lower temperature for stricter rule adherence
-        )
-        response = model.generate_content(full_prompt, generation_config=generation_config)
-        return json.loads(response.text)
+    async def _analyze_with_gemini_async(self, model_name: str, full_prompt: list) -> dict:
+        """Call Gemini API without blocking the event loop."""
+        model = self._models[model_name]
+        response = await model.generate_content_async(full_prompt, generation_config=_GENERATION_CONFIG)
+        # Malformed or off-schema output raises here, so the next model candidate wins
+        result = msgspec.json.decode(response.text, type=AnalysisResult)
+        return msgspec.structs.asdict(result)
 
     def chat_with_context(self, message: str, context: Dict[str, Any]) -> str:
         """
@@ -86,85 +230,81 @@ class GeminiClient:
         """
         model_name = "gemini-2.5-pro" # Hardcoded for supreme intelligence
         
-        system_prompt = f"""
-        You are an elite FIFA-certified VAR AI Expert. 
-        You have just analyzed a football clip.
-        
-        Here is your previous analysis (Context):
-        {json.dumps(context, indent=2)}
-        
-        The user is asking a follow-up question.
-        
-        CRITICAL RULES:
-        1. Verify the specific action (e.g., was it a header, a kick, a deflection?). Correct the user if they premise their question on the wrong action type.
-        2. Cite specific FIFA Laws (Law 11 Offside, Law 12 Handball).
-        3. Be concise, authoritative, and precise.
-        """
+        if orjson:
+            context_json = orjson.dumps(context, option=orjson.OPT_INDENT_2).decode()
+        else:
+            context_json = json.dumps(context, indent=2)
+        system_prompt = _CHAT_HEADER + context_json + _CHAT_RULES
         
         full_prompt = [system_prompt, f"User Question: {message}"]
         
         try:
             logger.info(f"Chatting with {model_name}...")
             # Use generate_content for single turn chat (stateless for now)
-            model = genai.GenerativeModel(model_name)
+            model = _get_model(model_name)
             response = model.generate_content(full_prompt)
             return response.text
         except Exception as e:
             logger.error(f"Chat error: {e}")
             return "I apologize, but I cannot answer that right now. System error."
 
-    def analyze_frames(
+    async def aanalyze_frames(
         self, 
         frames: List[Image.Image], 
         prompt: str = "Analyze this football clip for offside and handball violations."
     ) -> Dict[str, Any]:
         """
         Analyze frames with Gemini models using FIFA context.
+        All candidate models are queried concurrently; the first valid
+        response wins and the remaining requests are cancelled.
         """
-        system_instruction = f"""
-        You are an elite FIFA-certified VAR AI Assistant.
-        Your decisions must be based STRICTLY on the following FIFA Laws of the Game:
-        
-        {FIFA_RULES}
-        
-        CRITICAL: To prove your decision, you MUST provide geometric data.
-        1. Identify the 'offside_line_y' (normalized 0-1) where the last defender is positioned.
-        2. Identify key players (Attacker, Defender) with their 'box_2d' [ymin, xmin, ymax, xmax].
-        
-        Return JSON schema:
-        {{
-            "decision": "OFFSIDE" | "ONSIDE" | "HANDBALL" | "NO_INFRACTION" | "UNCLEAR",
-            "confidence": float,
-            "explanation": "string (cite specific Law 11/12 clauses)",
-            "visual_cues": "string (describe the geometry)",
-            "entities": [
-                {{"label": "Offside Line", "box_2d": [y, 0, y, 1]}}, 
-                {{"label": "Attacker"|"Defender"|"Ball", "box_2d": [ymin, xmin, ymax, xmax], "id": "string"}}
-            ]
-        }}
-        """
-        
-        last_exception = None
+        # Downscale and encode once up front; handing PIL images to the SDK would re-encode them for every model
+        encoded = [{"mime_type": "image/jpeg", "data": _pil_to_jpeg_bytes(_downscale(f), quality=80)} for f in frames]
+        full_prompt = [_get_system_instruction(), "Provide the JSON analysis with geometric proof.", prompt] + encoded
+
+        tasks = {}
         for model_name in self.models:
-            try:
-                logger.info(f"Attempting analysis with model: {model_name}")
-                
-                full_prompt = [system_instruction, "Provide the JSON analysis with geometric proof.", prompt] + frames
-                return self._analyze_with_gemini(model_name, full_prompt)
-                    
-            except Exception as e:
-                logger.error(f"Error with model {model_name}: {e}")
-                last_exception = e
-                continue
+            logger.info(f"Attempting analysis with model: {model_name}")
+            task = asyncio.create_task(self._analyze_with_gemini_async(model_name, full_prompt))
+            tasks[task] = model_name
+
+        last_exception = None
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        if is_credential_error(e):
+                            logger.error(f"Credential error with model {tasks[task]}, abandoning fallbacks: {e}")
+                            return _api_error(e)
+                        logger.error(f"Error with model {tasks[task]}: {e}")
+                        last_exception = e
+        finally:
+            # Losing speculative requests are no longer needed
+            for task in pending:
+                task.cancel()
         
-        return {
-            "decision": "API_ERROR",
-            "confidence": 0.0,
-            "explanation": f"All models failed. Last error: {str(last_exception)}"
-        }
+        return _api_error(last_exception)
+
+    def analyze_frames(
+        self, 
+        frames: List[Image.Image], 
+        prompt: str = "Analyze this football clip for offside and handball violations."
+    ) -> Dict[str, Any]:
+        """
+        Synchronous wrapper around `aanalyze_frames` for CLI/script callers.
+        Use `aanalyze_frames` directly from inside a running event loop.
+        """
+        return run_sync(self.aanalyze_frames(frames, prompt))
 
     def analyze_video_segment(self, frames: List[Image.Image], context: str = "") -> Dict[str, Any]:
         return self.analyze_frames(frames, prompt=context)
 
+    async def aanalyze_video_segment(self, frames: List[Image.Image], context: str = "") -> Dict[str, Any]:
+        return await self.aanalyze_frames(frames, prompt=context)
+
 def get_analyzer(model_name: str = None) -> GeminiClient:
     return GeminiClient(model_name)
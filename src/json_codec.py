@@ -0,0 +1,31 @@
+"""
+JSON codec for Offside Zero
+Uses orjson on hot paths when installed, stdlib json otherwise
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON text or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumpb(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (2-space indent when `indent`)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode()
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize to a JSON string, e.g. for prompt interpolation."""
+    return dumpb(obj, indent).decode()
@@ -0,0 +1,134 @@
+"""
+LLM Response Cache for Offside Zero
+Deterministic cache for agent JSON responses, keyed on prompt, context and image bytes
+"""
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol, Union
+
+from PIL import Image
+
+from src import json_codec
+
+
+class CacheBackend(Protocol):
+    """Storage for cached responses. Implementations must be thread-safe."""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]: ...
+
+    def set(self, key: str, value: Dict[str, Any]) -> None: ...
+
+
+class MemoryCache:
+    """In-process LRU over an OrderedDict. Stores and returns copies, as callers mutate results."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                return copy.deepcopy(value)
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data[key] = copy.deepcopy(value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class FileCache:
+    """
+    One JSON file per key; survives restarts and is shared between workers.
+    With `ttl` (seconds), entries older than that by mtime are treated as missing.
+    """
+
+    def __init__(self, directory: str, ttl: Optional[float] = None):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self.dir / f"{key}.json"
+        try:
+            if self.ttl is not None and time.time() - path.stat().st_mtime > self.ttl:
+                return None
+            return json_codec.loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        # Atomic replace so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json_codec.dumpb(value))
+            os.replace(tmp, self.dir / f"{key}.json")
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+class ResponseCache:
+    """Backend plus hit/miss counters."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.backend.set(key, value)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def make_key(model: str, role: str, prompt: str, context: Dict, images: List[Union[Image.Image, Dict[str, Any]]]) -> str:
+    """sha256 over the request text and every image (raw pixels, or the bytes of an encoded blob)."""
+    h = hashlib.sha256(json.dumps(
+        {"model": model, "role": role, "prompt": prompt, "context": context},
+        sort_keys=True, default=str
+    ).encode())
+    for img in images:
+        if isinstance(img, dict):
+            h.update(img.get("mime_type", "").encode())
+            h.update(hashlib.sha256(img["data"]).digest())
+            continue
+        h.update(f"{img.mode}{img.size}".encode())
+        h.update(hashlib.sha256(img.tobytes()).digest())
+    return h.hexdigest()
+
+
+def default_cache() -> Optional[ResponseCache]:
+    """
+    Build the process-wide cache from the environment.
+    LLM_CACHE_DIR selects the file backend; LLM_CACHE_SIZE=0 disables caching.
+    """
+    cache_dir = os.environ.get("LLM_CACHE_DIR")
+    if cache_dir:
+        return ResponseCache(FileCache(cache_dir))
+    size = int(os.environ.get("LLM_CACHE_SIZE", 256))
+    return ResponseCache(MemoryCache(size)) if size > 0 else None
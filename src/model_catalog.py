@@ -0,0 +1,45 @@
+"""
+Model Catalog for Offside Zero
+Caches the genai.list_models() catalog on disk so probe scripts skip discovery
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import google.generativeai as genai
+
+
+CACHE_PATH = Path.home() / ".offside-zero" / "models.json"
+DEFAULT_TTL_SECONDS = 3600
+
+
+def cached_list_models(ttl: float = DEFAULT_TTL_SECONDS, refresh: bool = False) -> List[Dict[str, Any]]:
+    """
+    Return the model catalog as plain dicts, fetching it only when stale.
+    
+    Args:
+        ttl: Maximum age of the on-disk cache in seconds
+        refresh: Ignore the cache and always hit the API
+    
+    Returns:
+        List of {"name", "display_name", "methods"} dicts
+    """
+    if not refresh and CACHE_PATH.exists() and time.time() - CACHE_PATH.stat().st_mtime < ttl:
+        try:
+            return json.loads(CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            pass  # Corrupt cache, fall through to a fresh fetch
+    
+    models = [
+        {
+            "name": m.name,
+            "display_name": m.display_name,
+            "methods": list(m.supported_generation_methods),
+        }
+        for m in genai.list_models()
+    ]
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    CACHE_PATH.write_text(json.dumps(models))
+    return models
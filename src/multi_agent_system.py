@@ -1,10 +1,16 @@
 import os
-import json
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import weakref
+import msgspec
+from typing import List, Dict, Any, Optional, Sequence, Union
 from PIL import Image
 import google.generativeai as genai
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src import json_codec
+from src.gemini_client import is_credential_error
+from src.llm_cache import ResponseCache, default_cache, make_key
+from src.sync_runner import run_sync
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,94 +20,264 @@ GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
+# Critical-moment scan: frames per manager call, and calls in flight at once
+# (keep SCAN_WORKERS under the model's RPM ceiling)
+SCAN_BATCH_SIZE = int(os.environ.get("SCAN_BATCH_SIZE", 12))
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", 4))
+
+# Opt-in explicit Gemini context caching for each agent's static prefix.
+# Off by default: cached contents have a minimum token size and are billed for storage.
+CONTEXT_CACHE = os.environ.get("GEMINI_CONTEXT_CACHE", "").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", 3600))
+
+# Models tried, in order, when an agent's own model errors or returns off-schema JSON
+AGENT_FALLBACK_MODELS = [m for m in os.environ.get(
+    "AGENT_FALLBACK_MODELS", "gemini-3-flash-preview,gemini-2.5-pro"
+).split(",") if m]
+
+# An image part: a PIL image, or an already-encoded {"mime_type", "data"} blob.
+# Blobs go to Gemini as-is; PIL images are re-encoded by the SDK on every call.
+ImagePart = Union[Image.Image, Dict[str, Any]]
+
+# Gemini requests in flight at once, shared by every agent and frame on a loop.
+# A call is admitted as soon as any other finishes, so the pipe stays full
+# without bursting past the model's RPM ceiling.
+AGENT_MAX_IN_FLIGHT = int(os.environ.get("AGENT_MAX_IN_FLIGHT", 16))
+_in_flight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def _in_flight_limit() -> asyncio.Semaphore:
+    # asyncio primitives are bound to one loop; the sync shims run on their own
+    loop = asyncio.get_running_loop()
+    sem = _in_flight.get(loop)
+    if sem is None:
+        sem = _in_flight[loop] = asyncio.Semaphore(AGENT_MAX_IN_FLIGHT)
+    return sem
+
+_GENERATION_CONFIG = genai.GenerationConfig(response_mime_type="application/json")
+
+# Response schemas; decoding and validation happen in one msgspec pass
+class Geometry(msgspec.Struct, omit_defaults=True):
+    offside_line: Optional[List[float]] = None
+    vanishing_point: Optional[List[float]] = None
+    confidence: float = 0.0
+
+class Detection(msgspec.Struct, omit_defaults=True):
+    box: Optional[List[float]] = None
+    label: str = ""
+
+class Vision(msgspec.Struct, omit_defaults=True):
+    attacker: Optional[Detection] = None
+    defender: Optional[Detection] = None
+    ball: Optional[Detection] = None
+
+class PerceptionOut(msgspec.Struct):
+    geometry: Geometry
+    vision: Vision
+
+class RulesOut(msgspec.Struct, omit_defaults=True):
+    decision: str
+    reasoning: str = ""
+    confidence: float = 0.0
+
+class CriticalMomentsOut(msgspec.Struct, omit_defaults=True):
+    critical_frame_indices: List[int] = []
+    reasoning: str = ""
+
+class VerdictOut(msgspec.Struct, omit_defaults=True):
+    decision: str
+    confidence: float = 0.0
+    explanation: str = ""
+    visual_cues: str = ""
+
+async def _fetch(frames: Sequence[ImagePart], key: Union[int, slice]):
+    """Index a frame sequence; lazy sources decode on access, so that runs off the event loop."""
+    if isinstance(frames, list):
+        return frames[key]
+    return await asyncio.to_thread(frames.__getitem__, key)
+
 class Agent:
-    def __init__(self, name: str, role: str, model_name: str = "gemini-2.5-flash"):
+    # Shared across agents so identical requests from any agent are served once
+    cache: Optional[ResponseCache] = default_cache()
+
+    def __init__(self, name: str, role: str, model_name: str = "gemini-2.5-flash", cacheable: bool = True,
+                 static_context: Optional[str] = None, schema: Optional[type] = None,
+                 fallback_models: Optional[List[str]] = None):
         self.name = name
-        self.role = role
-        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        # Expected response shape; off-schema output counts as a failed call
+        self.schema = schema
+        if fallback_models is None:
+            fallback_models = AGENT_FALLBACK_MODELS
+        self.fallback_models = [m for m in fallback_models if m != model_name]
+        # Per-call-invariant text (e.g. Law excerpts) sent once with the role, not with every task
+        self.static_context = static_context
+        # Set cacheable=False for agents whose answers are meant to vary between calls
+        self.cacheable = cacheable
         self.logger = logging.getLogger(f"Agent-{name}")
+        self.role = role
 
-    def think(self, prompt: str, images: List[Image.Image] = [], context: Dict = {}) -> Dict[str, Any]:
-        """Base thinking method. Returns JSON."""
-        try:
-            full_prompt = [
-                f"Role: {self.role}",
-                f"Context: {json.dumps(context)}",
-                "Task: " + prompt,
-                "Return valid JSON only."
-            ] + images
-            
-            response = self.model.generate_content(
-                full_prompt, 
-                generation_config={"response_mime_type": "application/json"}
-            )
-            return json.loads(response.text)
-        except Exception as e:
-            self.logger.error(f"Thinking failed: {e}")
-            return {"error": str(e)}
-
-class GeometryAgent(Agent):
-    def __init__(self):
-        super().__init__("Geometry", "You are an expert in Projective Geometry and Computer Vision. Your ONLY job is to determine the 3D perspective of the pitch and draw lines PARALLEL to the goal line.")
+    @property
+    def role(self) -> str:
+        return self._role
+
+    @role.setter
+    def role(self, role: str):
+        # The role is baked into the model's prefix, so changing it rebuilds the model
+        self._role = role
+        self._init_model()
 
-    def analyze_perspective(self, frame: Image.Image) -> Dict[str, Any]:
+    def _system_instruction(self) -> str:
+        parts = [f"Role: {self._role}", "Return valid JSON only."]
+        if self.static_context:
+            parts.append(self.static_context)
+        return "\n".join(parts)
+
+    def _init_model(self):
         """
-        Identifies the offside line coordinates.
-        Uses pure geometric reasoning (or suggests code - simplified here to direct analysis for speed).
+        Put the static Role/rules prefix in the system instruction so it is an
+        identical prefix on every call. With GEMINI_CONTEXT_CACHE set, the
+        prefix is also uploaded once as CachedContent and referenced by name.
         """
-        prompt = """
-        Analyze the image and identify the 'Offside Line' based on the last defender.
+        self.cached = None
+        instruction = self._system_instruction()
+        self.fallbacks = [genai.GenerativeModel(m, system_instruction=instruction) for m in self.fallback_models]
+        if CONTEXT_CACHE:
+            try:
+                cached = genai.caching.CachedContent.create(
+                    model=self.model_name,
+                    display_name=f"offside-zero-{self.name}",
+                    system_instruction=instruction,
+                    ttl=CONTEXT_CACHE_TTL,
+                )
+                self.cached = cached.name
+                self.model = genai.GenerativeModel.from_cached_content(cached)
+                return
+            except Exception as e:
+                # Typically the prefix is below the model's minimum cacheable size
+                self.logger.warning(f"Context cache unavailable, using system instruction: {e}")
+        self.model = genai.GenerativeModel(self.model_name, system_instruction=instruction)
+
+    def _build_prompt(self, prompt: str, images: List[ImagePart], context: Dict) -> list:
+        parts = ["Task: " + prompt]
+        if context:
+            parts.insert(0, f"Context: {json_codec.dumps(context)}")
+        return parts + images
+
+    def _cache_key(self, prompt: str, images: List[ImagePart], context: Dict) -> Optional[str]:
+        if self.cache is None or not self.cacheable:
+            return None
+        return make_key(self.model_name, self._system_instruction(), prompt, context, images)
+
+    def _remember(self, key: Optional[str], result: Dict[str, Any]) -> Dict[str, Any]:
+        # Failures are never cached so the next call retries the API
+        if key is not None and isinstance(result, dict) and "error" not in result:
+            self.cache.set(key, result)
+        return result
+
+    def think(self, prompt: str, images: List[ImagePart] = [], context: Dict = {}) -> Dict[str, Any]:
+        """Base thinking method. Returns JSON. Sync shim over `athink`."""
+        return run_sync(self.athink(prompt, images, context))
+
+    def _decode(self, text: str) -> Dict[str, Any]:
+        if self.schema is None:
+            return json_codec.loads(text)
+        return msgspec.to_builtins(msgspec.json.decode(text, type=self.schema))
+
+    async def athink(self, prompt: str, images: List[ImagePart] = [], context: Dict = {}) -> Dict[str, Any]:
+        """
+        Awaits the Gemini call instead of blocking a thread. An API error or
+        malformed/off-schema JSON moves straight on to the next fallback model
+        rather than re-asking the same one; invalid credentials end the chain.
+        """
+        key = self._cache_key(prompt, images, context)
+        if key is not None and (cached := self.cache.get(key)) is not None:
+            return cached
+        contents = self._build_prompt(prompt, images, context)
+        error = None
+        for model in [self.model, *self.fallbacks]:
+            try:
+                async with _in_flight_limit():
+                    response = await model.generate_content_async(
+                        contents, 
+                        generation_config=_GENERATION_CONFIG
+                    )
+                return self._remember(key, self._decode(response.text))
+            except Exception as e:
+                error = e
+                self.logger.error(f"Thinking failed on {getattr(model, 'model_name', model)}: {e}")
+                # A rejected API key fails the same way on every fallback model
+                if is_credential_error(e):
+                    break
+        return {"error": str(error)}
+
+class PerceptionAgent(Agent):
+    """
+    Geometry and vision in one call: the frame is uploaded and the shared
+    context processed once, instead of once per specialist agent.
+    """
+    def __init__(self):
+        super().__init__("Perception", "You are an expert in Projective Geometry, Computer Vision and Sports Analysis. You determine the 3D perspective of the pitch, draw lines PARALLEL to the goal line, and identify players, the ball, and their exact body positions.",
+                         schema=PerceptionOut)
+
+    PROMPT = """
+        Perform BOTH tasks below on the same image.
         
-        CRITICAL: 
+        Task A - Geometry: identify the 'Offside Line' based on the last defender.
         1. Identify the goal line (or implied goal line).
         2. Identify the rearmost geometric point of the second-last opponent (the defender).
         3. Project a line through that point PARALLEL to the goal line.
         
-        Return JSON:
-        {
-            "offside_line": [start_x, start_y, end_x, end_y] (0-1 normalized),
-            "vanishing_point": [x, y],
-            "confidence": float
-        }
-        """
-        return self.think(prompt, [frame])
-
-class VisionAgent(Agent):
-    def __init__(self):
-        super().__init__("Vision", "You are an expert Sports Analyst. Your job is to identify players, the ball, and their exact body positions.")
-
-    def detect_entities(self, frame: Image.Image) -> Dict[str, Any]:
-        prompt = """
-        Detect the following entities:
+        Task B - Vision: detect the following entities:
         1. The Ball (and distinct 'kick point' moment if visible).
         2. The Attacker (involved in the play).
         3. The Second-Last Defender (setting the line).
-        
         For the Attacker and Defender, identify the specific body part closest to the goal line (Head, Foot, Knee).
         
         Return JSON:
         {
-            "attacker": {"box": [ymin, xmin, ymax, xmax], "label": "Attacker (Body Part)"},
-            "defender": {"box": [ymin, xmin, ymax, xmax], "label": "Defender (Body Part)"},
-            "ball": {"box": [ymin, xmin, ymax, xmax]}
+            "geometry": {
+                "offside_line": [start_x, start_y, end_x, end_y] (0-1 normalized),
+                "vanishing_point": [x, y],
+                "confidence": float
+            },
+            "vision": {
+                "attacker": {"box": [ymin, xmin, ymax, xmax], "label": "Attacker (Body Part)"},
+                "defender": {"box": [ymin, xmin, ymax, xmax], "label": "Defender (Body Part)"},
+                "ball": {"box": [ymin, xmin, ymax, xmax]}
+            }
         }
         """
-        return self.think(prompt, [frame])
+
+    @staticmethod
+    def _split(result: Dict[str, Any]) -> tuple:
+        """Return (geometry, vision); a failed call leaves both empty."""
+        if not isinstance(result, dict) or "error" in result:
+            return {}, {}
+        return result.get("geometry") or {}, result.get("vision") or {}
+
+    def perceive(self, frame: ImagePart) -> tuple:
+        return run_sync(self.aperceive(frame))
+
+    async def aperceive(self, frame: ImagePart) -> tuple:
+        return self._split(await self.athink(self.PROMPT, [frame]))
 
 class RulesAgent(Agent):
+    LAW_TEXT = """
+        Law 11 Basics:
+        - Offside if any part of head, body, or feet is nearer to goal line than both ball and second-last opponent.
+        - Hands/Arms do not count.
+        """
+
     def __init__(self):
-        super().__init__("Rules", "You are a FIFA Certified Referee. You interpret Law 11 (Offside) and Law 12 (Fouls/Handball). You do NOT draw lines; you adjudicate based on data.")
+        super().__init__("Rules", "You are a FIFA Certified Referee. You interpret Law 11 (Offside) and Law 12 (Fouls/Handball). You do NOT draw lines; you adjudicate based on data.",
+                         static_context=self.LAW_TEXT, schema=RulesOut)
 
-    def adjudicate(self, geometry_data: Dict, vision_data: Dict) -> Dict[str, Any]:
-        prompt = f"""
+    def _prompt(self, geometry_data: Dict, vision_data: Dict) -> str:
+        return f"""
         Adjudicate this play based on the provided data.
         
-        Geometry Data: {json.dumps(geometry_data)}
-        Vision Data: {json.dumps(vision_data)}
-        
-        Law 11 Basics:
-        - Offside if any part of head, body, or feet is nearer to goal line than both ball and second-last opponent.
-        - Hands/Arms do not count.
+        Geometry Data: {json_codec.dumps(geometry_data)}
+        Vision Data: {json_codec.dumps(vision_data)}
         
         Make a decision.
         
@@ -112,45 +288,16 @@ class RulesAgent(Agent):
             "confidence": float
         }}
         """
-        # No image needed, pure logic on data
-        return self.think(prompt)
 
-class MultiAgentOrchestrator:
-    def __init__(self):
-        # Use Flash for specialized sub-tasks (Higher Quota)
-        self.geometry_agent = GeometryAgent()
-        self.vision_agent = VisionAgent()
-        self.rules_agent = RulesAgent()
-        # Use Pro only for final synthesis where high reasoning is critical
-        self.manager = Agent("Manager", "You are the VAR Process Coordinator.", model_name="gemini-2.5-flash")
-        self.synthesizer = Agent("Synthesizer", "Final VAR Judge.", model_name="gemini-2.5-pro")
+    def adjudicate(self, geometry_data: Dict, vision_data: Dict) -> Dict[str, Any]:
+        return run_sync(self.aadjudicate(geometry_data, vision_data))
 
-    def process_frame(self, frame: Image.Image) -> Dict[str, Any]:
-        """
-        Map Step: specific agents analyze the frame in parallel.
-        """
-        with ThreadPoolExecutor() as executor:
-            future_geo = executor.submit(self.geometry_agent.analyze_perspective, frame)
-            future_vis = executor.submit(self.vision_agent.detect_entities, frame)
-            
-            geo_result = future_geo.result() or {}
-            vis_result = future_vis.result() or {}
-            
-        # Reduce Step 1: Adjudicate per frame
-        rule_result = self.rules_agent.adjudicate(geo_result, vis_result)
-        
-        return {
-            "geometry": geo_result,
-            "vision": vis_result,
-            "rule_verdict": rule_result or {"decision": "UNCLEAR", "error": "Rule agent failed"}
-        }
+    async def aadjudicate(self, geometry_data: Dict, vision_data: Dict) -> Dict[str, Any]:
+        # No image needed, pure logic on data
+        return await self.athink(self._prompt(geometry_data, vision_data))
 
-    def detect_critical_moments(self, frames: List[Image.Image]) -> List[int]:
-        """
-        Manager Agent scans all frames to find critical ballplays (passes, shots, deflections).
-        Returns indices of frames that need deep analysis.
-        """
-        prompt = """
+class MultiAgentOrchestrator:
+    CRITICAL_MOMENTS_PROMPT = """
         Review these video frames. Identify ONLY the "Critical Ballplays" relevant to VAR.
         
         Critical definitions:
@@ -158,6 +305,7 @@ class MultiAgentOrchestrator:
         2. The moment of a potential handball or foul.
         
         Ignore frames where the ball is just traveling or nothing is happening.
+        Frames are numbered from 0 in the order given.
         
         Return JSON:
         {
@@ -165,48 +313,81 @@ class MultiAgentOrchestrator:
             "reasoning": "string"
         }
         """
-        # We assume the manager uses a faster model for this scan or we batch it
-        # using the manager's default model (Gemini 2.5 Pro) is fine for high quality selection
-        result = self.manager.think(prompt, frames)
-        indices = result.get("critical_frame_indices", [])
-        logger.info(f"Manager detected critical frames: {indices}")
-        return indices
 
-    def process_clip(self, frames: List[Image.Image]) -> Dict[str, Any]:
+    def __init__(self):
+        # Use Flash for specialized sub-tasks (Higher Quota)
+        self.perception_agent = PerceptionAgent()
+        self.rules_agent = RulesAgent()
+        # Use Pro only for final synthesis where high reasoning is critical
+        self.manager = Agent("Manager", "You are the VAR Process Coordinator.", model_name="gemini-2.5-flash",
+                             schema=CriticalMomentsOut)
+        self.synthesizer = Agent("Synthesizer", "Final VAR Judge.", model_name="gemini-2.5-pro",
+                                 schema=VerdictOut)
+
+    @staticmethod
+    def _frame_report(geo_result: Dict, vis_result: Dict, rule_result: Dict) -> Dict[str, Any]:
+        return {
+            "geometry": geo_result,
+            "vision": vis_result,
+            "rule_verdict": rule_result or {"decision": "UNCLEAR", "error": "Rule agent failed"}
+        }
+
+    def process_frame(self, frame: ImagePart) -> Dict[str, Any]:
+        """Sync shim over `aprocess_frame`."""
+        return run_sync(self.aprocess_frame(frame))
+
+    async def aprocess_frame(self, frame: ImagePart) -> Dict[str, Any]:
         """
-        Coordinator Workflow:
-        1. Manager scans video for Critical Moments.
-        2. Swarm analyzes ONLY those critical frames.
-        3. Synthesis of the final verdict.
+        Map Step: one perception call covers geometry and vision for the frame
+        (rank 0), then feeds the rules agent (rank 1).
         """
-        # Step 1: Critical Play Detection
-        critical_indices = self.detect_critical_moments(frames)
+        geo_result, vis_result = await self.perception_agent.aperceive(frame)
         
-        if not critical_indices:
-            logger.warning("No critical moments found. Analyzing middle frame as fallback.")
-            critical_indices = [len(frames) // 2]
-            
-        frame_results = []
+        # Reduce Step 1: Adjudicate per frame
+        rule_result = await self.rules_agent.aadjudicate(geo_result, vis_result)
         
-        # Step 2: Parallel Swarm Execution for Critical Frames ONLY
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            # Map indices to futures
-            futures = {executor.submit(self.process_frame, frames[i]): i for i in critical_indices}
-            
-            for future in as_completed(futures):
-                i = futures[future]
-                try:
-                    res = future.result()
-                    res['frame_index'] = i
-                    frame_results.append(res)
-                except Exception as e:
-                    logger.error(f"Frame {i} failed: {e}")
-
-        # Step 3: Final Synthesis
-        synthesis_prompt = f"""
+        return self._frame_report(geo_result, vis_result, rule_result)
+
+    @staticmethod
+    def _scan_batches(frames: Sequence[ImagePart]) -> List[slice]:
+        return [slice(offset, offset + SCAN_BATCH_SIZE)
+                for offset in range(0, len(frames), SCAN_BATCH_SIZE)]
+
+    @staticmethod
+    def _batch_indices(result: Dict[str, Any], offset: int, size: int) -> List[int]:
+        """Map batch-relative indices back onto the clip, dropping out-of-range ones."""
+        indices = result.get("critical_frame_indices", []) if isinstance(result, dict) else []
+        return [offset + i for i in indices if isinstance(i, int) and 0 <= i < size]
+
+    def detect_critical_moments(self, frames: Sequence[ImagePart]) -> List[int]:
+        """Sync shim over `adetect_critical_moments`."""
+        return run_sync(self.adetect_critical_moments(frames))
+
+    async def adetect_critical_moments(self, frames: Sequence[ImagePart]) -> List[int]:
+        """
+        Manager Agent scans all frames to find critical ballplays (passes, shots, deflections).
+        Frames are scanned in fixed-size batches so per-call latency stays bounded on long clips.
+        Returns indices of frames that need deep analysis.
+        """
+        sem = asyncio.Semaphore(SCAN_WORKERS)
+
+        async def scan(batch: slice):
+            async with sem:
+                images = await _fetch(frames, batch)
+                result = await self.manager.athink(self.CRITICAL_MOMENTS_PROMPT, images)
+                return self._batch_indices(result, batch.start, len(images))
+
+        results = await asyncio.gather(*[scan(batch) for batch in self._scan_batches(frames)])
+        indices = [i for batch_indices in results for i in batch_indices]
+        logger.info(f"Manager detected critical frames: {indices}")
+        return indices
+
+    @staticmethod
+    def _synthesis_prompt(frame_results: List[Dict[str, Any]]) -> str:
+        return f"""
         Review the swarm reports from the CRITICAL moments ID'd by the Manager.
         
-        Reports: {json.dumps(frame_results)}
+        Reports: {json_codec.dumps(frame_results)}
         
         Determine the final VAR decision.
         
@@ -219,9 +400,10 @@ class MultiAgentOrchestrator:
             "annotated_frames": [] (Placeholder)
         }}
         """
-        
-        final_verdict = self.synthesizer.think(synthesis_prompt)
-        
+
+    @staticmethod
+    def _merge_verdict(final_verdict: Dict[str, Any], frame_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Attach drawable entities from the most impactful frame to the verdict."""
         # Merge data logic
         # Pick the most impactful frame (e.g. first offside or first critical)
         if not frame_results:
@@ -256,3 +438,40 @@ class MultiAgentOrchestrator:
              final_verdict['entities'].append({"label": "Defender", "box_2d": defender.get('box')})
 
         return final_verdict
+
+    def process_clip(self, frames: Sequence[ImagePart]) -> Dict[str, Any]:
+        """Sync shim over `aprocess_clip`."""
+        return run_sync(self.aprocess_clip(frames))
+
+    async def aprocess_clip(self, frames: Sequence[ImagePart]) -> Dict[str, Any]:
+        """
+        Coordinator Workflow:
+        1. Manager scans video for Critical Moments.
+        2. Swarm analyzes ONLY those critical frames, fanned out on the event
+           loop so latency is bounded by the slowest frame, not their sum.
+        3. Synthesis of the final verdict.
+        """
+        critical_indices = await self.adetect_critical_moments(frames)
+        
+        if not critical_indices:
+            logger.warning("No critical moments found. Analyzing middle frame as fallback.")
+            critical_indices = [len(frames) // 2]
+            
+        frame_results = []
+        async def process(i: int):
+            return await self.aprocess_frame(await _fetch(frames, i))
+
+        results = await asyncio.gather(
+            *[process(i) for i in critical_indices],
+            return_exceptions=True
+        )
+        for i, res in zip(critical_indices, results):
+            if isinstance(res, Exception):
+                logger.error(f"Frame {i} failed: {res}")
+                continue
+            res['frame_index'] = i
+            frame_results.append(res)
+
+        final_verdict = await self.synthesizer.athink(self._synthesis_prompt(frame_results))
+        
+        return self._merge_verdict(final_verdict, frame_results)
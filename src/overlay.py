@@ -3,10 +3,20 @@ Overlay Engine for Offside Zero
 Draws offside lines, zones, and annotations on video frames
 """
 
+import functools
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
+
+
+BANNER_HEIGHT = 80
+
+
+@functools.lru_cache(maxsize=64)
+def _text_size(text: str, font: int, font_scale: float, thickness: int) -> Tuple[Tuple[int, int], int]:
+    """Memoized cv2.getTextSize; overlay labels repeat on every frame."""
+    return cv2.getTextSize(text, font, font_scale, thickness)
 
 
 class OverlayEngine:
@@ -28,6 +38,12 @@ class OverlayEngine:
         """Initialize with frame dimensions."""
         self.width = width
         self.height = height
+        # Dash spans [x_start, x_end] for the offside line: 20px dashes, 10px gaps
+        self._dash_xs = np.array(
+            [[x, min(x + 20, width)] for x in range(0, width, 30)], dtype=np.int32
+        ).reshape(-1, 2)
+        # Black strip blended under the decision banner (rows 0..BANNER_HEIGHT inclusive)
+        self._banner_strip = np.zeros((BANNER_HEIGHT + 1, width, 3), dtype=np.uint8)
     
     def draw_offside_line(
         self,
@@ -35,7 +51,8 @@ class OverlayEngine:
         y_normalized: float,
         color: Tuple[int, int, int] = None,
         thickness: int = 3,
-        label: str = "OFFSIDE LINE"
+        label: str = "OFFSIDE LINE",
+        inplace: bool = False
     ) -> np.ndarray:
         """
         Draw a horizontal offside line across the frame.
@@ -46,28 +63,27 @@ class OverlayEngine:
             color: Line color (BGR)
             thickness: Line thickness
             label: Label text
+            inplace: Draw on `frame` itself instead of a copy
         
         Returns:
             Frame with overlay
         """
-        frame = frame.copy()
+        if not inplace:
+            frame = frame.copy()
         color = color or self.COLORS["offside_line"]
         
         y = int(y_normalized * self.height)
         
-        # Draw dashed line
-        dash_length = 20
-        gap_length = 10
-        x = 0
-        while x < self.width:
-            x_end = min(x + dash_length, self.width)
-            cv2.line(frame, (x, y), (x_end, y), color, thickness)
-            x += dash_length + gap_length
+        # Draw dashed line: every dash in a single polylines call
+        segments = np.empty((len(self._dash_xs), 2, 2), dtype=np.int32)
+        segments[:, :, 0] = self._dash_xs
+        segments[:, :, 1] = y
+        cv2.polylines(frame, segments, False, color, thickness)
         
         # Add label
         font = cv2.FONT_HERSHEY_SIMPLEX
         font_scale = 0.7
-        (text_width, text_height), _ = cv2.getTextSize(label, font, font_scale, 2)
+        (text_width, text_height), _ = _text_size(label, font, font_scale, 2)
         
         # Background for text
         cv2.rectangle(
@@ -88,10 +104,12 @@ class OverlayEngine:
         y_normalized: float,
         player_id: str = "",
         is_violation: bool = False,
-        is_attacker: bool = True
+        is_attacker: bool = True,
+        inplace: bool = False
     ) -> np.ndarray:
         """Draw a marker on a player."""
-        frame = frame.copy()
+        if not inplace:
+            frame = frame.copy()
         
         x = int(x_normalized * self.width)
         y = int(y_normalized * self.height)
@@ -121,10 +139,12 @@ class OverlayEngine:
         self,
         frame: np.ndarray,
         x_normalized: float,
-        y_normalized: float
+        y_normalized: float,
+        inplace: bool = False
     ) -> np.ndarray:
         """Draw a marker on the ball."""
-        frame = frame.copy()
+        if not inplace:
+            frame = frame.copy()
         
         x = int(x_normalized * self.width)
         y = int(y_normalized * self.height)
@@ -145,16 +165,17 @@ class OverlayEngine:
         frame: np.ndarray,
         decision: str,
         confidence: float,
-        explanation: str = ""
+        explanation: str = "",
+        inplace: bool = False
     ) -> np.ndarray:
         """Draw a VAR-style decision banner."""
-        frame = frame.copy()
+        if not inplace:
+            frame = frame.copy()
         
-        # Banner background
-        banner_height = 80
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, 0), (self.width, banner_height), (0, 0, 0), -1)
-        frame = cv2.addWeighted(overlay, 0.7, frame, 0.3, 0)
+        # Banner background: darken only the banner rows, in place
+        roi = frame[0:BANNER_HEIGHT + 1]
+        strip = self._banner_strip[:roi.shape[0], :roi.shape[1]]
+        cv2.addWeighted(strip, 0.7, roi, 0.3, 0, dst=roi)
         
         # Decision text
         font = cv2.FONT_HERSHEY_SIMPLEX
@@ -189,10 +210,12 @@ class OverlayEngine:
         frame: np.ndarray,
         x_normalized: float,
         y_normalized: float,
-        radius_normalized: float = 0.05
+        radius_normalized: float = 0.05,
+        inplace: bool = False
     ) -> np.ndarray:
         """Highlight handball contact area."""
-        frame = frame.copy()
+        if not inplace:
+            frame = frame.copy()
         
         x = int(x_normalized * self.width)
         y = int(y_normalized * self.height)
@@ -209,6 +232,76 @@ class OverlayEngine:
         
         return frame
     
+    @staticmethod
+    def _valid_box(entity: Dict) -> bool:
+        box = entity.get("box_2d")
+        return bool(box) and isinstance(box, list) and len(box) >= 4
+
+    # Planners take the entity, its normalized (x_center, y_center) and
+    # whether the verdict is OFFSIDE, and return one draw step.
+    def _plan_offside_line(self, entity: Dict, center: List[float], offside: bool) -> Tuple[Callable, tuple, dict]:
+        # Assuming box_2d [ymin, xmin, ymax, xmax], we take average Y
+        return (self.draw_offside_line, (center[1],), {})
+
+    def _plan_player(self, entity: Dict, center: List[float], offside: bool) -> Tuple[Callable, tuple, dict]:
+        is_attacker = (entity.get("label") == "Attacker")
+        return (self.draw_player_marker, (center[0], center[1]), {
+            "player_id": entity.get("id", ""),
+            "is_violation": is_attacker and offside,
+            "is_attacker": is_attacker
+        })
+
+    def _plan_ball(self, entity: Dict, center: List[float], offside: bool) -> Tuple[Callable, tuple, dict]:
+        return (self.draw_ball_marker, (center[0], center[1]), {})
+
+    # label -> (z-layer, planner); layers are drawn back to front, banner last
+    _HANDLERS = {
+        "Offside Line": (0, _plan_offside_line),
+        "Attacker": (1, _plan_player),
+        "Defender": (1, _plan_player),
+        "Ball": (2, _plan_ball),
+    }
+
+    def _plan_annotations(self, analysis: Dict) -> List[Tuple[Callable, tuple, dict]]:
+        """
+        Resolve a Gemini analysis into an ordered list of draw calls.
+        
+        Entity parsing and coordinate math happen once here, so the plan
+        can be replayed cheaply on any number of frames.
+        """
+        layers = [[], [], []]
+        
+        # Parse 'entities' from Gemini 2.0 schema: keep drawable ones in a single pass
+        entities = [e for e in analysis.get("entities", [])
+                    if e.get("label", "") in self._HANDLERS and self._valid_box(e)]
+        if entities:
+            # [ymin, xmin, ymax, xmax] -> normalized (x_center, y_center), all entities at once
+            boxes = np.array([e["box_2d"][:4] for e in entities], dtype=np.float64)
+            centers = boxes[:, [1, 0, 3, 2]].reshape(-1, 2, 2).mean(axis=1).tolist()
+            offside = analysis.get("decision") == "OFFSIDE"
+            for entity, center in zip(entities, centers):
+                z, plan_entity = self._HANDLERS[entity["label"]]
+                layers[z].append(plan_entity(self, entity, center, offside))
+        
+        plan = [step for layer in layers for step in layer]
+        
+        # Decision banner on top
+        plan.append((self.draw_decision_banner, (
+            analysis.get("decision", "UNCLEAR"),
+            analysis.get("confidence", 0.0),
+            str(analysis.get("explanation", ""))[:80]
+        ), {}))
+        
+        return plan
+    
+    @staticmethod
+    def _apply_plan(frame: np.ndarray, plan: List[Tuple[Callable, tuple, dict]]) -> np.ndarray:
+        # One copy per frame; every draw call then mutates it in place
+        result = frame.copy()
+        for draw, args, kwargs in plan:
+            draw(result, *args, inplace=True, **kwargs)
+        return result
+    
     def create_annotated_frame(
         self,
         frame: np.ndarray,
@@ -224,60 +317,25 @@ class OverlayEngine:
         Returns:
             Annotated frame
         """
-        result = frame.copy()
+        return self._apply_plan(frame, self._plan_annotations(analysis))
+    
+    def create_annotated_frames(
+        self,
+        frames: List[np.ndarray],
+        analysis: Dict
+    ) -> List[np.ndarray]:
+        """
+        Annotate a batch of frames with the same analysis.
         
-        # Parse 'entities' from Gemini 2.0 schema
-        entities = analysis.get("entities", [])
-        
-        # 1. Draw Offside Line first (background layer)
-        for entity in entities:
-            if entity.get("label") == "Offside Line":
-                # Assuming box_2d [ymin, xmin, ymax, xmax], we take average Y
-                box = entity.get("box_2d")
-                if box and isinstance(box, list) and len(box) >= 4:
-                    y_norm = (box[0] + box[2]) / 2
-                    result = self.draw_offside_line(result, y_norm)
-
-        # 2. Draw Players
-        for entity in entities:
-            label = entity.get("label", "")
-            if label in ["Attacker", "Defender"]:
-                box = entity.get("box_2d")
-                if box and isinstance(box, list) and len(box) >= 4:
-                    # Center point
-                    y_center = (box[0] + box[2]) / 2
-                    x_center = (box[1] + box[3]) / 2
-                    
-                    is_attacker = (label == "Attacker")
-                    is_violation = is_attacker and analysis.get("decision") == "OFFSIDE"
-                    
-                    result = self.draw_player_marker(
-                        result,
-                        x_center,
-                        y_center,
-                        player_id=entity.get("id", ""),
-                        is_violation=is_violation,
-                        is_attacker=is_attacker
-                    )
-
-        # 3. Draw Ball
-        for entity in entities:
-            if entity.get("label") == "Ball":
-                box = entity.get("box_2d")
-                if box and isinstance(box, list) and len(box) >= 4:
-                    y_center = (box[0] + box[2]) / 2
-                    x_center = (box[1] + box[3]) / 2
-                    result = self.draw_ball_marker(result, x_center, y_center)
-        
-        # 5. Draw decision banner
-        result = self.draw_decision_banner(
-            result,
-            analysis.get("decision", "UNCLEAR"),
-            analysis.get("confidence", 0.0),
-            str(analysis.get("explanation", ""))[:80]
-        )
+        Args:
+            frames: Input frames (BGR)
+            analysis: Analysis result shared by all frames
         
-        return result
+        Returns:
+            Annotated frames, in input order
+        """
+        plan = self._plan_annotations(analysis)
+        return [self._apply_plan(frame, plan) for frame in frames]
 
 
 def create_overlay_engine(width: int, height: int) -> OverlayEngine:
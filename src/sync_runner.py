@@ -0,0 +1,24 @@
+"""
+Sync runner for Offside Zero
+Runs coroutines from synchronous code on one persistent background event loop
+"""
+
+import asyncio
+import threading
+from typing import Optional
+
+# genai's async client keeps a gRPC channel bound to the loop that created it,
+# so a fresh asyncio.run() per call would break every call after the first.
+# Every sync entry point in the process shares this one loop.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def run_sync(coro):
+    """Run a coroutine to completion from synchronous code."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="genai-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
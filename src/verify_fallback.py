@@ -1,17 +1,17 @@
 import sys
 import os
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from PIL import Image
 
-# Add current directory to path to import gemini_client
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Add the repo root to path to import src.gemini_client
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Patch genai.configure before importing gemini_client to avoid actual network calls or key checks if possible?
 # But gemini_client imports genai at top level.
 # We will rely on the existing .env or just mock os.environ if needed.
 # Let's hope the environment is set up as per previous context.
 
-from gemini_client import GeminiClient
+from src.gemini_client import GeminiClient
 
 def test_fallback():
     print("Testing fallback strategy...")
@@ -25,7 +25,7 @@ def test_fallback():
         
         # When GenerativeModel is instantiated, it returns a mock object.
         # We need to distinguish between instances or just count calls?
-        # The client instantiates a new model in the loop: model = genai.GenerativeModel(model_name)
+        # The client instantiates a new model per candidate: model = genai.GenerativeModel(model_name)
         
         # Let's track which model is being instantiated
         model_instances = {}
@@ -41,9 +41,9 @@ def test_fallback():
         def get_model_side_effect(model_name):
             mock_instance = MagicMock()
             if model_name == "fake-model-1":
-                mock_instance.generate_content.side_effect = mock_generate_content_fail
+                mock_instance.generate_content_async = AsyncMock(side_effect=mock_generate_content_fail)
             else:
-                mock_instance.generate_content.side_effect = mock_generate_content_success
+                mock_instance.generate_content_async = AsyncMock(side_effect=mock_generate_content_success)
             return mock_instance
             
         MockModel.side_effect = get_model_side_effect
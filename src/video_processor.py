@@ -5,10 +5,33 @@ Extracts frames from video for analysis
 
 import cv2
 import os
-from typing import List, Tuple, Optional
+import shutil
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple, Optional, Union
 from PIL import Image
 import numpy as np
 
+try:
+    import av  # optional: hardware-accelerated decode via PyAV
+except ImportError:
+    av = None
+
+logger = logging.getLogger(__name__)
+
+# PyAV hardware decoder ("cuda", "vaapi", "videotoolbox", ...). Empty keeps OpenCV.
+HWACCEL = os.environ.get("VIDEO_HWACCEL", "")
+_hwaccel_failed = False  # set after the first failed open; stop retrying the device
+
+# Longest side of frames uploaded to Gemini; it tiles images at <=768px anyway
+UPLOAD_MAX_SIDE = int(os.environ.get("UPLOAD_MAX_SIDE", 768))
+
+# Decoded frames a LazyFrameSource keeps resident
+FRAME_CACHE_SIZE = int(os.environ.get("FRAME_CACHE_SIZE", 32))
+
 
 class VideoProcessor:
     def __init__(self, video_path: str):
@@ -37,7 +60,13 @@ class VideoProcessor:
         }
     
     def extract_frame(self, frame_number: int, retries: int = 3) -> Optional[np.ndarray]:
-        """Extract a single frame by frame number with retry logic."""
+        """
+        Extract a single frame by frame number with retry logic.
+        
+        Each call seeks, which on inter-frame codecs (H.264) means decoding
+        forward from the previous keyframe. Use `extract_frames_range` or
+        `extract_frames_at_indices` when more than one frame is needed.
+        """
         for attempt in range(retries):
             self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
             ret, frame = self.cap.read()
@@ -48,23 +77,181 @@ class VideoProcessor:
                 continue
         return None
     
+    def extract_frames_at_indices(self, indices: List[int]) -> List[np.ndarray]:
+        """
+        Extract several frames with a single ffmpeg decode pass.
+        
+        ffmpeg seeks (input -ss) to the first requested frame, its select
+        filter keeps only the requested frame numbers, and -frames:v stops the
+        decode at the last one, so only the span between them is decoded. The
+        frames are piped as raw RGB, avoiding one OpenCV seek+decode per frame.
+        Falls back to `extract_frame` when the ffmpeg binary is missing or fails.
+        """
+        wanted = sorted({i for i in indices if 0 <= i < self.frame_count})
+        if not wanted:
+            return []
+        
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg and self.fps:
+            start = wanted[0]
+            # Half a frame early so timestamp rounding can't skip `start`;
+            # after the seek, select's n counts from `start`
+            seek = max(0.0, (start - 0.5) / self.fps)
+            select = "+".join(f"eq(n\\,{i - start})" for i in wanted)
+            cmd = [
+                ffmpeg, "-v", "error", "-ss", f"{seek:.6f}", "-i", self.video_path,
+                "-vf", f"select={select}", "-vsync", "0", "-frames:v", str(len(wanted)),
+                "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"
+            ]
+            try:
+                proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+                frame_size = self.width * self.height * 3
+                data = proc.stdout
+                if frame_size and len(data) == frame_size * len(wanted):
+                    decoded = {
+                        i: np.frombuffer(data, np.uint8, frame_size, k * frame_size).reshape(self.height, self.width, 3)
+                        for k, i in enumerate(wanted)
+                    }
+                    return [decoded[i] for i in indices if i in decoded]
+            except (OSError, subprocess.CalledProcessError):
+                pass
+        
+        # OpenCV fallback: seek and decode each frame individually
+        frames = []
+        for i in indices:
+            frame = self.extract_frame(i)
+            if frame is not None:
+                frames.append(frame)
+        return frames
+    
+    def candidate_critical_frames(
+        self,
+        max_candidates: int = 3,
+        scale_width: int = 160,
+        k: float = 2.0,
+        min_gap: int = 3,
+        max_scan_frames: int = 3000
+    ) -> List[int]:
+        """
+        Cheap motion pre-filter run before any LLM call.
+        
+        Scores every frame by its mean absolute difference from the previous
+        one (downscaled greyscale) and keeps the spikes - fast play, contact,
+        scene cuts - above mean + k*std of the clip's own motion. The strongest
+        `max_candidates` are kept, at least `min_gap` frames apart so one
+        event doesn't fill the budget with its neighbours.
+        
+        The scan decodes the whole clip, so clips longer than
+        `max_scan_frames` are not scanned at all.
+        
+        Returns:
+            Candidate frame indices in ascending order (empty for static or over-long clips)
+        """
+        if self.frame_count > max_scan_frames:
+            return []
+        scale = min(1.0, scale_width / self.width) if self.width else 1.0
+        scores = []
+        prev = None
+        
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        while self.cap.grab():
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                break
+            small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            scores.append(0.0 if prev is None else float(cv2.absdiff(gray, prev).mean()))
+            prev = gray
+        
+        if len(scores) < 2:
+            return []
+        motion = np.asarray(scores)
+        # Threshold adapts to the clip's own baseline motion
+        threshold = motion[1:].mean() + k * motion[1:].std()
+        picked = []
+        for i in np.argsort(motion)[::-1]:
+            if motion[i] <= threshold or len(picked) == max_candidates:
+                break
+            if all(abs(int(i) - j) >= min_gap for j in picked):
+                picked.append(int(i))
+        return sorted(picked)
+    
     def extract_frame_at_time(self, seconds: float) -> Optional[np.ndarray]:
         """Extract frame at specific timestamp."""
         frame_number = int(seconds * self.fps)
         return self.extract_frame(frame_number)
     
+    def _iter_frames_hw(self, start_frame: int, end_frame: int, fmt: str) -> Optional[Iterator[Tuple[int, np.ndarray]]]:
+        """
+        Decode [start_frame, end_frame) with PyAV on the configured hardware
+        decoder, yielding (frame_number, ndarray in `fmt`).
+        
+        Returns None when PyAV or the device is unavailable, so callers keep
+        the OpenCV path.
+        """
+        global _hwaccel_failed
+        if av is None or not HWACCEL or _hwaccel_failed or self.fps <= 0:
+            return None
+        try:
+            from av.codec.hwaccel import HWAccel
+            container = av.open(
+                self.video_path,
+                hwaccel=HWAccel(device_type=HWACCEL, allow_software_fallback=True)
+            )
+        except Exception as e:
+            _hwaccel_failed = True
+            logger.warning(f"Hardware decode unavailable ({HWACCEL}), using OpenCV: {e}")
+            return None
+        
+        def frames():
+            with container:
+                stream = container.streams.video[0]
+                stream.thread_type = "AUTO"
+                if start_frame > 0:
+                    # Lands on the keyframe at or before start_frame
+                    container.seek(int(start_frame / self.fps / stream.time_base), stream=stream)
+                for frame in container.decode(stream):
+                    if frame.time is None:
+                        continue
+                    i = round(frame.time * self.fps)
+                    if i < start_frame:
+                        continue
+                    if i >= end_frame:
+                        break
+                    yield i, frame.to_ndarray(format=fmt)
+        
+        return frames()
+    
     def extract_frames_range(
         self, 
         start_frame: int, 
         end_frame: int, 
         step: int = 1
     ) -> List[np.ndarray]:
-        """Extract multiple frames in a range."""
+        """
+        Extract multiple frames in a range.
+        
+        Seeks once, then streams forward: every frame is grabbed (demux only)
+        but only every `step`-th one is decoded and converted. Decodes on
+        the GPU instead when VIDEO_HWACCEL is set and PyAV is installed.
+        """
         frames = []
-        for i in range(start_frame, min(end_frame, self.frame_count), step):
-            frame = self.extract_frame(i)
-            if frame is not None:
-                frames.append(frame)
+        end_frame = min(end_frame, self.frame_count)
+        if start_frame >= end_frame:
+            return frames
+        
+        hw_frames = self._iter_frames_hw(start_frame, end_frame, "rgb24")
+        if hw_frames is not None:
+            return [frame for i, frame in hw_frames if (i - start_frame) % step == 0]
+        
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        for i in range(start_frame, end_frame):
+            if not self.cap.grab():
+                break
+            if (i - start_frame) % step == 0:
+                ret, frame = self.cap.retrieve()
+                if ret:
+                    frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
         return frames
     
     def extract_frames_around(
@@ -77,6 +264,11 @@ class VideoProcessor:
         Extract frames around a specific timestamp.
         Useful for analyzing a specific incident.
         """
+        start, end, step = self._window_around(center_time, window_seconds, num_frames)
+        return self.extract_frames_range(start, end, step)
+    
+    def _window_around(self, center_time: float, window_seconds: float, num_frames: int) -> Tuple[int, int, int]:
+        """(start, end, step) frame range used by `extract_frames_around`."""
         center_frame = int(center_time * self.fps)
         window_frames = int(window_seconds * self.fps)
         
@@ -84,7 +276,16 @@ class VideoProcessor:
         end = min(self.frame_count, center_frame + window_frames // 2)
         
         step = max(1, (end - start) // num_frames)
-        return self.extract_frames_range(start, end, step)
+        return start, end, step
+    
+    def indices_around(
+        self, 
+        center_time: float, 
+        window_seconds: float = 1.0,
+        num_frames: int = 5
+    ) -> List[int]:
+        """Frame numbers `extract_frames_around` would return, without decoding them."""
+        return list(range(*self._window_around(center_time, window_seconds, num_frames)))
     
     def save_frames(
         self, 
@@ -92,15 +293,26 @@ class VideoProcessor:
         output_dir: str, 
         prefix: str = "frame"
     ) -> List[str]:
-        """Save frames to disk and return paths."""
+        """
+        Save frames to disk and return paths.
+        
+        cv2.imencode and file writes both release the GIL, so frames are
+        encoded and written in parallel on a thread pool.
+        """
         os.makedirs(output_dir, exist_ok=True)
-        paths = []
+        paths = [os.path.join(output_dir, f"{prefix}_{i:04d}.jpg") for i in range(len(frames))]
+        params = [cv2.IMWRITE_JPEG_QUALITY, 90]
+        
+        def encode_save(path: str, frame: np.ndarray):
+            ok, buf = cv2.imencode('.jpg', cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), params)
+            if not ok:
+                raise ValueError(f"Could not encode frame: {path}")
+            with open(path, 'wb') as f:
+                f.write(buf.tobytes())
         
-        for i, frame in enumerate(frames):
-            path = os.path.join(output_dir, f"{prefix}_{i:04d}.jpg")
-            img = Image.fromarray(frame)
-            img.save(path, "JPEG", quality=90)
-            paths.append(path)
+        if frames:
+            with ThreadPoolExecutor(max_workers=min(len(frames), os.cpu_count() or 1)) as executor:
+                list(executor.map(encode_save, paths, frames))
         
         return paths
     
@@ -108,6 +320,30 @@ class VideoProcessor:
         """Convert numpy frames to PIL Images."""
         return [Image.fromarray(f) for f in frames]
     
+    def frames_to_jpeg_bytes(
+        self,
+        frames: List[np.ndarray],
+        quality: int = 85,
+        max_side: Optional[int] = None
+    ) -> List[bytes]:
+        """
+        Encode RGB frames to JPEG bytes once, ready to send to Gemini as
+        {"mime_type": "image/jpeg", "data": ...} blobs without a PIL round-trip.
+        Frames larger than `max_side` are shrunk first (INTER_AREA); the
+        input arrays are left untouched for full-resolution overlays.
+        """
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        encoded = []
+        for f in frames:
+            if max_side:
+                scale = max_side / max(f.shape[:2])
+                if scale < 1:
+                    f = cv2.resize(f, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode('.jpg', cv2.cvtColor(f, cv2.COLOR_RGB2BGR), params)
+            if ok:
+                encoded.append(buf.tobytes())
+        return encoded
+    
     def create_slow_motion(
         self,
         start_time: float,
@@ -136,13 +372,18 @@ class VideoProcessor:
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         out = cv2.VideoWriter(output_path, fourcc, new_fps, (self.width, self.height))
         
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-        
-        for _ in range(end_frame - start_frame):
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-            out.write(frame)
+        hw_frames = self._iter_frames_hw(start_frame, end_frame, "bgr24")
+        if hw_frames is not None:
+            for _, frame in hw_frames:
+                out.write(frame)
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            
+            for _ in range(end_frame - start_frame):
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                out.write(frame)
         
         out.release()
         return output_path
@@ -158,6 +399,91 @@ class VideoProcessor:
         self.close()
 
 
+class LazyFrameSource:
+    """
+    Sequence view over selected frames of a video, decoded on demand.
+    
+    Items are JPEG blobs ({"mime_type", "data"}) ready for Gemini, shrunk to
+    UPLOAD_MAX_SIDE; `frame(i)` gives the full-resolution RGB ndarray for overlays. At most `cache_size` decoded frames
+    stay resident (LRU), so memory does not grow with clip length.
+    Thread-safe: all decoding goes through one capture under a lock.
+    """
+    
+    def __init__(
+        self,
+        video_path: str,
+        indices: Optional[List[int]] = None,
+        cache_size: int = FRAME_CACHE_SIZE
+    ):
+        self.video = VideoProcessor(video_path)
+        # Position -> frame number; defaults to every frame of the clip
+        self.indices = list(indices) if indices is not None else list(range(self.video.frame_count))
+        self.cache_size = max(1, cache_size)
+        self._cache: "OrderedDict[int, Tuple[np.ndarray, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.indices)
+    
+    def _put(self, pos: int, frame: np.ndarray):
+        data = self.video.frames_to_jpeg_bytes([frame], max_side=UPLOAD_MAX_SIDE)[0]
+        blob = {"mime_type": "image/jpeg", "data": data}
+        self._cache[pos] = (frame, blob)
+        self._cache.move_to_end(pos)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def _entry(self, pos: int) -> Tuple[np.ndarray, Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(pos)
+            if entry is not None:
+                self._cache.move_to_end(pos)
+                return entry
+            frame = self.video.extract_frame(self.indices[pos])
+            if frame is None:
+                raise IndexError(f"Could not decode frame {self.indices[pos]}")
+            self._put(pos, frame)
+            return self._cache[pos]
+    
+    def prefetch(self, positions: Optional[List[int]] = None):
+        """Decode several positions in one ffmpeg pass instead of seeking per frame."""
+        positions = list(range(len(self))) if positions is None else positions
+        with self._lock:
+            missing = [p for p in positions if p not in self._cache][:self.cache_size]
+            if not missing:
+                return
+            frames = self.video.extract_frames_at_indices([self.indices[p] for p in missing])
+            # Frames come back in request order unless some failed to decode;
+            # in that case leave them all to on-demand decoding
+            if len(frames) == len(missing):
+                for p, frame in zip(missing, frames):
+                    self._put(p, frame)
+    
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            return [self._entry(p)[1] for p in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        return self._entry(key)[1]
+    
+    def frame(self, pos: int) -> np.ndarray:
+        """RGB ndarray at `pos`."""
+        return self._entry(pos)[0]
+    
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+            self.video.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
 def load_video(path: str) -> VideoProcessor:
     """Factory function to load a video."""
     return VideoProcessor(path)
@@ -0,0 +1,61 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+
+# Add the repo root to path so modules import as `src.*`, the same as in the app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.analysis_service import AnalysisService
+
+class TestAnalysisOutputs(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.video = os.path.join(cls.tmp, "t.mp4")
+        writer = cv2.VideoWriter(cls.video, cv2.VideoWriter_fourcc(*"mp4v"), 25, (160, 120))
+        for i in range(100):
+            frame = np.full((120, 160, 3), 60, np.uint8)
+            cv2.circle(frame, (30 + i, 60), 6, (255, 255, 255), -1)
+            writer.write(frame)
+        writer.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def setUp(self):
+        self.out = tempfile.mkdtemp(dir=self.tmp)
+        self.service = AnalysisService(self.out, cache_dir=tempfile.mkdtemp(dir=self.tmp))
+
+    def _analyze(self, decision, timestamp=None):
+        verdict = {"decision": decision, "confidence": 0.9}
+        with patch.object(self.service.orchestrator, "process_clip", return_value=verdict) as process_clip:
+            result = self.service.analyze_clip(self.video, timestamp=timestamp)
+        return result, process_clip.call_count
+
+    def _read_outputs(self, result):
+        return [open(os.path.join(self.out, p), "rb").read() for p in result["annotated_frames"]]
+
+    def test_cache_hit_keeps_its_own_outputs(self):
+        full, _ = self._analyze("OFFSIDE")
+        full_images = self._read_outputs(full)
+
+        # Same clip at a timestamp: a separate analysis that must not touch the full-clip outputs
+        at_ts, _ = self._analyze("ONSIDE", timestamp=2.0)
+        self.assertTrue(set(full["annotated_frames"]).isdisjoint(at_ts["annotated_frames"]))
+
+        hit, calls = self._analyze("SHOULD_NOT_RUN")
+        self.assertEqual(calls, 0)
+        self.assertEqual(hit["decision"], "OFFSIDE")
+        self.assertEqual(hit["annotated_frames"], full["annotated_frames"])
+        self.assertEqual(self._read_outputs(hit), full_images)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,67 +1,122 @@
+import asyncio
 import sys
 import os
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
+from google.api_core import exceptions as api_exceptions
 from PIL import Image
 
-# Add src to path
-sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+# Add the repo root to path so modules import as `src.*`, the same as in the app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from gemini_client import GeminiClient
+from src.gemini_client import GeminiClient, _get_model
+
+class _Resp:
+    def __init__(self, text):
+        self.text = text
+
+class _FakeModel:
+    """Stands in for a GenerativeModel: raises `behavior` if it is an exception, else answers with it as text."""
+
+    def __init__(self, behavior, delay=0.0):
+        self.behavior = behavior
+        self.delay = delay
+        self.finished = False
+
+    async def generate_content_async(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.finished = True
+        if isinstance(self.behavior, Exception):
+            raise self.behavior
+        return _Resp(self.behavior)
+
+class _LoopBoundModel(_FakeModel):
+    """Like genai's shared gRPC aio client: unusable from any loop but the one that first called it."""
+
+    def __init__(self, behavior):
+        super().__init__(behavior)
+        self.loop = None
+
+    async def generate_content_async(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif loop is not self.loop:
+            raise RuntimeError("Event loop is closed")
+        return await super().generate_content_async(*args, **kwargs)
 
 class TestGeminiClientFallback(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Read-only input shared by every test; copy() it in a test that needs to draw on it
+        cls.img = Image.new('RGB', (100, 100))
+
+    def setUp(self):
+        # Model handles are memoized per process; start each test clean
+        _get_model.cache_clear()
+
+    def _analyze(self, fakes, runs=1):
+        """
+        Build a GeminiClient over `fakes` ({model name: fake model}, in fallback order) and
+        analyze the shared image `runs` times. The client resolves model handles at construction,
+        so it is built inside the patches too. Returns (results, patched GenerativeModel).
+        """
+        with patch('google.generativeai.configure'), \
+                patch('google.generativeai.GenerativeModel', side_effect=fakes.__getitem__) as MockModel, \
+                patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"}):
+            client = GeminiClient(model_name=list(fakes))
+            results = [client.analyze_frames([self.img]) for _ in range(runs)]
+        return results, MockModel
     
-    @patch('google.generativeai.GenerativeModel')
-    @patch('google.generativeai.configure')
-    @patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
-    def test_fallback_success(self, mock_configure, MockModel):
-        print("\nTesting fallback strategy...")
-        
-        # Setup mock behavior: First model fails, second succeeds
-        mock_instance_fail = MagicMock()
-        mock_instance_fail.generate_content.side_effect = Exception("Simulated API Error (Rate Limit)")
-        
-        mock_instance_success = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = '{"decision": "SUCCESS", "confidence": 1.0}'
-        mock_instance_success.generate_content.return_value = mock_response
+    def test_fallback_success(self):
+        # First model fails, second succeeds
+        (result,), MockModel = self._analyze({
+            "fake-model-1": _FakeModel(Exception("Simulated API Error (Rate Limit)")),
+            "fake-model-2": _FakeModel('{"decision": "SUCCESS", "confidence": 1.0}'),
+        })
         
-        # Map model instantiation to mock instances
-        # We need to distinguish calls. Since side_effect on MockModel can return different instances based on call order or args.
-        # But MockModel is called with model_name.
-        
-        def get_model_side_effect(model_name):
-            if model_name == "fake-model-1":
-                return mock_instance_fail
-            else:
-                return mock_instance_success
-            
-        MockModel.side_effect = get_model_side_effect
-        
-        # Initialize client with fallback list
-        client = GeminiClient(model_name=["fake-model-1", "fake-model-2"])
-        
-        # Create dummy image
-        img = Image.new('RGB', (100, 100))
-        
-        print("Calling analyze_frames...")
-        result = client.analyze_frames([img])
-        
-        print(f"Result: {result}")
-        
-        # Verify fallback happened
         self.assertEqual(result.get("decision"), "SUCCESS")
+        # Both models were attempted, in order
+        self.assertEqual([c[0][0] for c in MockModel.call_args_list], ["fake-model-1", "fake-model-2"])
+
+    def test_invalid_schema_falls_back(self):
+        # First model answers with JSON missing required fields, second is valid
+        (result,), _ = self._analyze({
+            "fake-model-1": _FakeModel('{"verdict": "OFFSIDE"}'),
+            "fake-model-2": _FakeModel('{"decision": "ONSIDE", "confidence": 0.9}'),
+        })
         
-        # Verify both models were attempted
-        # MockModel was called with "fake-model-1" then "fake-model-2"
-        # We can check calls on MockModel
-        first_call_args = MockModel.call_args_list[0]
-        second_call_args = MockModel.call_args_list[1]
+        self.assertEqual(result.get("decision"), "ONSIDE")
+        self.assertEqual(result.get("entities"), [])
+
+    def test_auth_error_skips_fallbacks(self):
+        # Bad credentials would fail on every model, so the slower candidate must not be waited on
+        slow = _FakeModel('{"decision": "ONSIDE", "confidence": 0.9}', delay=5.0)
+        (result,), _ = self._analyze({
+            "fake-model-1": _FakeModel(api_exceptions.Unauthenticated("Request had invalid authentication credentials")),
+            "fake-model-2": slow,
+        })
         
-        self.assertEqual(first_call_args[0][0], "fake-model-1")
-        self.assertEqual(second_call_args[0][0], "fake-model-2")
+        self.assertEqual(result.get("decision"), "API_ERROR")
+        self.assertFalse(slow.finished)
+
+    def test_permission_denied_still_falls_back(self):
+        # A fast 403 on one model (e.g. no preview access) must not beat a slower model that succeeds
+        (result,), _ = self._analyze({
+            "fake-model-1": _FakeModel(api_exceptions.PermissionDenied("Model not enabled for this key")),
+            "fake-model-2": _FakeModel('{"decision": "ONSIDE", "confidence": 0.9}', delay=0.2),
+        })
+        
+        self.assertEqual(result.get("decision"), "ONSIDE")
+
+    def test_sync_calls_share_one_loop(self):
+        # Handles are memoized, so repeat calls (and new clients) reuse a model bound to its first loop
+        fakes = {"fake-model-1": _LoopBoundModel('{"decision": "ONSIDE", "confidence": 0.9}')}
+        results, _ = self._analyze(fakes, runs=2)
+        more, _ = self._analyze(fakes)
         
-        print("VERIFICATION SUCCESS: Fallback worked (caught exception and tried next model)")
+        self.assertEqual([r.get("decision") for r in results + more], ["ONSIDE"] * 3)
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+# Add the repo root to path so modules import as `src.*`, the same as in the app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.video_processor import VideoProcessor
+
+def _write_clip(path, levels, frames=100):
+    """Grey clip with a slowly moving dot; `levels` maps a start frame to the background level from there on."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 25, (160, 120))
+    level = levels.get(0, 60)
+    for i in range(frames):
+        level = levels.get(i, level)
+        frame = np.full((120, 160, 3), level, np.uint8)
+        cv2.circle(frame, (30 + i, 60), 6, (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+class TestCandidateCriticalFrames(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def _candidates(self, levels, **kwargs):
+        path = os.path.join(self.tmp, f"clip_{len(os.listdir(self.tmp))}.mp4")
+        _write_clip(path, levels)
+        return VideoProcessor(path).candidate_critical_frames(**kwargs)
+
+    def test_picks_the_cut_frames(self):
+        # Two scene cuts; the dot's own motion stays below the threshold
+        self.assertEqual(self._candidates({0: 60, 30: 140, 70: 40}), [30, 70])
+
+    def test_strongest_spike_wins_the_budget(self):
+        self.assertEqual(self._candidates({0: 60, 30: 140, 70: 40}, max_candidates=1), [70])
+
+    def test_static_clip_has_no_candidates(self):
+        self.assertEqual(self._candidates({}), [])
+
+    def test_long_clip_is_not_scanned(self):
+        self.assertEqual(self._candidates({0: 60, 30: 140, 70: 40}, max_scan_frames=50), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,65 +1,426 @@
+import os
+
+# One producer stream gains nothing from OpenCV's all-cores pools; they only contend with the
+# encoder threads and the event loop. Set before cv2 loads so the FFMPEG backend sees it.
+# A future batch-encode path that wants intra-op parallelism should raise these again.
+os.environ.setdefault('OPENCV_FFMPEG_THREADS', '1')
+
 import cv2
-import requests
+import numpy as np
+import aiohttp
+import asyncio
 import time
 import argparse
-import os
+import socket
 import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+try:
+    # Optional HTTP/2 transport (--http2); needs the h2 extra: pip install "httpx[http2]"
+    import httpx
+except ImportError:
+    httpx = None
+
+cv2.setNumThreads(1)
+
+try:
+    # libjpeg-turbo's SIMD encoder via PyTurboJPEG, when both are installed
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo = TurboJPEG()
+except Exception:
+    _turbo = None
+
+JPEG_QUALITY = 85
+
+def encode_jpeg(frame, max_edge=None):
+    """Encode a BGR frame to JPEG, returning a bytes-like payload. Frames longer than `max_edge` are shrunk first."""
+    h, w = frame.shape[:2]
+    if max_edge and max(h, w) > max_edge:
+        scale = max_edge / max(h, w)
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    if _turbo is not None:
+        return _turbo.encode(frame, quality=JPEG_QUALITY, pixel_format=TJPF_BGR)
+    _, img_encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    # A memoryview over the encoder's buffer avoids a tobytes() copy
+    return memoryview(img_encoded).cast('B')
+
+def _dhash(frame):
+    """64-bit difference hash: one bit per horizontally adjacent pixel pair of a 9x8 grey thumbnail."""
+    small = cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = gray[:, 1:] > gray[:, :-1]
+    return int(np.packbits(bits).view(np.uint64)[0])
+
+def _open_capture(video_path):
+    """Open with FFMPEG hardware decode when this OpenCV build supports it, else plain software decode."""
+    if hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG,
+                               [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if cap.isOpened():
+            return cap
+    return cv2.VideoCapture(video_path)
+
+# Linux values; older Pythons don't export them from the socket module
+SO_ZEROCOPY = getattr(socket, 'SO_ZEROCOPY', 60)
+MSG_ZEROCOPY = getattr(socket, 'MSG_ZEROCOPY', 0x4000000)
+
+async def _writable(loop, sock):
+    fut = loop.create_future()
+    loop.add_writer(sock.fileno(), fut.set_result, None)
+    try:
+        await fut
+    finally:
+        loop.remove_writer(sock.fileno())
+
+async def _readable(loop, sock):
+    fut = loop.create_future()
+    loop.add_reader(sock.fileno(), fut.set_result, None)
+    try:
+        await fut
+    finally:
+        loop.remove_reader(sock.fileno())
+
+def _drain_completions(sock):
+    """
+    Discard queued MSG_ZEROCOPY completion notices. While any are queued the socket reports
+    EPOLLERR, which wakes both readers and writers, so every wait on a zerocopy socket drains first.
+    """
+    while True:
+        try:
+            sock.recvmsg(1, 1024, socket.MSG_ERRQUEUE)
+        except OSError:
+            return
+
+async def _sendmsg_all(loop, sock, buffers, flags=0):
+    """sendmsg() every buffer in order, waiting for room whenever the socket buffer is full."""
+    views = [memoryview(b).cast('B') for b in buffers]
+    while views:
+        try:
+            sent = sock.sendmsg(views, (), flags)
+        except BlockingIOError:
+            if flags & MSG_ZEROCOPY:
+                _drain_completions(sock)
+            await _writable(loop, sock)
+            continue
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+class RawIngestClient:
+    """
+    Minimal keep-alive HTTP/1.1 multipart poster on non-blocking sockets, one per in-flight POST.
+    Headers and multipart framing live in small buffers next to the untouched JPEG buffers, and the
+    kernel gathers them (sendmsg iovecs), so no body-sized concatenation happens in user space.
+    With `zerocopy` (Linux), JPEG bodies are sent with MSG_ZEROCOPY so the kernel transmits straight
+    from the encoder's buffer instead of copying it. The kernel may reference those pages until the
+    data is acknowledged; the server's response implies that, so payloads only need to outlive post().
+    """
+
+    def __init__(self, server_url, zerocopy=False, timeout=0.5):
+        url = urlsplit(server_url)
+        if url.scheme != 'http':
+            raise ValueError("The raw transport only speaks plain http://")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.target = url.path or '/'
+        if url.query:
+            self.target += '?' + url.query
+        self.zerocopy = zerocopy and sys.platform.startswith('linux')
+        self.timeout = timeout
+        self._idle = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        for sock in self._idle:
+            sock.close()
+        self._idle.clear()
+
+    async def _connect(self, loop):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            if self.zerocopy:
+                sock.setsockopt(socket.SOL_SOCKET, SO_ZEROCOPY, 1)
+            await loop.sock_connect(sock, (self.host, self.port))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    async def _recv(self, loop, sock, size):
+        if not self.zerocopy:
+            return await loop.sock_recv(sock, size)
+        # Our own wait loop: completion notices arriving mid-wait must be drained on every
+        # wakeup, or EPOLLERR keeps the socket "readable" and sock_recv spins on EAGAIN
+        while True:
+            _drain_completions(sock)
+            try:
+                return sock.recv(size)
+            except BlockingIOError:
+                await _readable(loop, sock)
+
+    async def _read_response(self, loop, sock):
+        """Read one response; returns (status, keep_alive)."""
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = await self._recv(loop, sock, 4096)
+            if not chunk:
+                raise ConnectionError("Server closed the connection")
+            data += chunk
+        head, _, body = data.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(':') for line in lines[1:])}
+        if 'content-length' not in headers:
+            return status, False
+        remaining = int(headers['content-length']) - len(body)
+        while remaining > 0:
+            chunk = await self._recv(loop, sock, min(remaining, 4096))
+            if not chunk:
+                raise ConnectionError("Server closed the connection")
+            remaining -= len(chunk)
+        return status, headers.get('connection', '').lower() != 'close'
+
+    async def _exchange(self, loop, sock, parts):
+        boundary = uuid.uuid4().hex
+        pieces = []
+        for filename, payload in parts:
+            pieces.append((f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                           'Content-Type: image/jpeg\r\n\r\n').encode())
+            pieces.append(payload)
+            pieces.append(b'\r\n')
+        pieces.append(f'--{boundary}--\r\n'.encode())
+        length = sum(memoryview(p).nbytes for p in pieces)
+        head = (f'POST {self.target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                f'Content-Type: multipart/form-data; boundary={boundary}\r\n'
+                f'Content-Length: {length}\r\n\r\n').encode()
+        # The whole request, batch included, is handed to the kernel in one sendmsg() rather than
+        # one send() per header and part; only a full socket buffer splits it into more calls
+        await _sendmsg_all(loop, sock, [head] + pieces, MSG_ZEROCOPY if self.zerocopy else 0)
+        return await self._read_response(loop, sock)
+
+    async def post(self, parts):
+        """POST `parts` ([(filename, jpeg)]) as multipart 'file' fields; returns the HTTP status."""
+        loop = asyncio.get_running_loop()
+        sock = self._idle.pop() if self._idle else await self._connect(loop)
+        try:
+            status, keep_alive = await asyncio.wait_for(self._exchange(loop, sock, parts), self.timeout)
+        except BaseException:
+            sock.close()
+            raise
+        if keep_alive:
+            self._idle.append(sock)
+        else:
+            sock.close()
+        if status >= 400:
+            raise RuntimeError(f"HTTP {status}")
+        return status
+
+def _open_session(max_in_flight, http2=False, server_url=None, zerocopy=False, raw=False):
+    """
+    Client for the ingest POSTs: aiohttp over HTTP/1.1 keep-alive, httpx with HTTP/2 multiplexing,
+    or the raw-socket scatter-gather poster (optionally zerocopy).
+    """
+    if raw or zerocopy:
+        # sendmsg() and loop.add_writer() are POSIX-only (no Windows proactor loop support)
+        if hasattr(socket.socket, 'sendmsg') and sys.platform != 'win32':
+            return RawIngestClient(server_url, zerocopy=zerocopy)
+        print("Raw socket transport unavailable on this platform; using aiohttp.")
+    if http2:
+        if httpx is None:
+            raise RuntimeError('--http2 requires httpx: pip install "httpx[http2]"')
+        # Once h2 is negotiated (ALPN, so an https ingest server with h2 enabled) every in-flight
+        # POST is a stream on one connection; against a plain HTTP/1.1 server this degrades to a pool
+        return httpx.AsyncClient(http2=True, timeout=0.5, limits=httpx.Limits(max_connections=max_in_flight))
+    # Keep-alive pool sized to the in-flight window
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=0.5))
 
-def simulate_stream(video_path, server_url, fps=30):
+async def _send(session, server_url, parts):
+    """POST `parts` ([(filename, jpeg)]) as multipart 'file' fields."""
+    if isinstance(session, RawIngestClient):
+        await session.post(parts)
+        return
+    if httpx is not None and isinstance(session, httpx.AsyncClient):
+        # httpx's multipart encoder only takes bytes, so this path pays one copy per frame
+        files = [('file', (filename, bytes(payload), 'image/jpeg')) for filename, payload in parts]
+        response = await session.post(server_url, files=files)
+        response.raise_for_status()
+        return
+    form = aiohttp.FormData()
+    for filename, payload in parts:
+        form.add_field('file', payload, filename=filename, content_type='image/jpeg')
+    async with session.post(server_url, data=form) as response:
+        await response.read()
+        response.raise_for_status()
+
+async def _post_frame(session, server_url, payload, frame_number):
+    try:
+        await _send(session, server_url, [('frame.jpg', payload)])
+    except Exception as e:
+        print(f"Frame {frame_number} failed: {e}")
+
+async def _post_batch(session, server_url, batch):
+    try:
+        await _send(session, server_url, [(f'f{frame_number}.jpg', payload) for frame_number, payload in batch])
+    except Exception as e:
+        print(f"Frames {batch[0][0]}-{batch[-1][0]} failed: {e}")
+
+async def simulate_stream(video_path, server_url, fps=30, max_in_flight=4, batch_size=1, dedup_threshold=3,
+                          max_edge=768, http2=False, zerocopy=False,
+                          raw=False):
     if not os.path.exists(video_path):
         print(f"Error: Video file not found: {video_path}")
         return
 
-    cap = cv2.VideoCapture(video_path)
+    cap = _open_capture(video_path)
     if not cap.isOpened():
         print("Error: Could not open video.")
         return
 
+    # Frames to drop between sends so a high-fps source plays in real time at `fps`;
+    # grab() still decodes (later frames reference earlier ones) but skips colour conversion and the copy out
+    src_fps = cap.get(cv2.CAP_PROP_FPS)
+    skip = max(1, round(src_fps / fps)) - 1 if src_fps > 0 else 0
+
+    # Decode into two preallocated frames, alternating after each submitted encode: one encode
+    # may still be reading its frame while the next is decoded into the other
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    frame_bufs = [np.empty((height, width, 3), np.uint8) if width and height else None for _ in range(2)]
+    buf_slot = 0
+
     print(f"Streaming {video_path} to {server_url} at {fps} FPS...")
-    
+
     frame_delay = 1.0 / fps
     frame_count = 0
-    
-    try:
-        while True:
-            start_time = time.time()
-            
-            ret, frame = cap.read()
-            if not ret:
-                print("End of video stream.")
-                break # Loop? Or stop? Let's stop for now.
-
-            # Encode frame to JPEG
-            _, img_encoded = cv2.imencode('.jpg', frame)
-            
+    # Frames whose deadline had already passed when their work finished
+    frames_late = 0
+    # Frames within `dedup_threshold` bits of the last sent frame's hash are neither encoded nor posted,
+    # though one still goes out every second so small motion the 8x8 hash can't see isn't held back forever
+    frames_unchanged = 0
+    prev_hash = None
+    unchanged_run = 0
+    # POSTs still awaiting a response; encoding the next frame overlaps with these
+    in_flight = set()
+    # (frame_count, jpeg) pairs waiting to go out as one multipart POST when batching
+    batch = []
+
+    # cv2/turbojpeg release the GIL while encoding, so the loop keeps driving POSTs meanwhile.
+    # Frame N+1 is submitted before frame N's encode is awaited, so both workers can be busy
+    loop = asyncio.get_running_loop()
+    encoder = ThreadPoolExecutor(max_workers=2)
+    # (frame_count, future) for the encode submitted last and not yet posted
+    pending = None
+
+    async def queue_payload(frame_number, payload):
+        nonlocal batch, in_flight
+        # Queue the frame; only a full batch turns into a request
+        request = None
+        if batch_size > 1:
+            batch.append((frame_number, payload))
+            if len(batch) >= batch_size:
+                request = _post_batch(session, server_url, batch)
+                batch = []
+        else:
+            request = _post_frame(session, server_url, payload, frame_number)
+
+        if request is not None:
+            # Window full: wait for any POST to finish before sending another
+            if len(in_flight) >= max_in_flight:
+                _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
             # Send to server
-            files = {'file': ('frame.jpg', img_encoded.tobytes(), 'image/jpeg')}
-            try:
-                response = requests.post(server_url, files=files, timeout=0.5)
-                # print(f"Frame {frame_count}: {response.status_code}")
-            except Exception as e:
-                print(f"Frame {frame_count} failed: {e}")
-
-            frame_count += 1
-            
-            # Sleep to maintain FPS
-            elapsed = time.time() - start_time
-            sleep_time = max(0, frame_delay - elapsed)
-            time.sleep(sleep_time)
-            
-            if frame_count % fps == 0:
-                print(f"Streamed {frame_count} frames...")
+            in_flight.add(asyncio.create_task(request))
 
-    except KeyboardInterrupt:
-        print("Streaming stopped.")
+    try:
+        async with _open_session(max_in_flight, http2, server_url, zerocopy, raw) as session:
+            # Absolute monotonic deadlines: lateness on one frame doesn't push back the rest
+            next_t = time.monotonic()
+            while True:
+                for _ in range(skip):
+                    cap.grab()
+                ret, frame = cap.read(frame_bufs[buf_slot])
+                if not ret:
+                    print("End of video stream.")
+                    break # Loop? Or stop? Let's stop for now.
+
+                # OpenCV reallocates if the probed size was wrong; keep whatever it handed back
+                frame_bufs[buf_slot] = frame
+
+                # Static scene: nothing new to show, so skip the encode and the POST
+                frame_hash = _dhash(frame) if dedup_threshold > 0 else None
+                if (prev_hash is not None and unchanged_run < fps - 1
+                        and bin(frame_hash ^ prev_hash).count('1') < dedup_threshold):
+                    frames_unchanged += 1
+                    unchanged_run += 1
+                else:
+                    prev_hash = frame_hash
+                    unchanged_run = 0
+
+                    # Downscale and encode frame to JPEG, then post the previous one while it runs
+                    submitted = (frame_count, loop.run_in_executor(encoder, encode_jpeg, frame, max_edge))
+                    buf_slot ^= 1
+                    if pending is not None:
+                        await queue_payload(pending[0], await pending[1])
+                    pending = submitted
+
+                frame_count += 1
+
+                # Sleep to maintain FPS; the loop keeps driving in-flight POSTs meanwhile
+                next_t += frame_delay
+                remaining = next_t - time.monotonic()
+                if remaining < 0:
+                    frames_late += 1
+                elif remaining > 0:
+                    await asyncio.sleep(remaining)
+
+                if frame_count % fps == 0:
+                    print(f"Streamed {frame_count} frames...")
+
+            # Post the last encode, then flush a partial batch left over at end of stream
+            if pending is not None:
+                await queue_payload(pending[0], await pending[1])
+                pending = None
+            if batch:
+                in_flight.add(asyncio.create_task(_post_batch(session, server_url, batch)))
+            if in_flight:
+                await asyncio.wait(in_flight)
+            print(f"Streamed {frame_count} frames ({frames_unchanged} unchanged, not sent), {frames_late} late.")
     finally:
+        for task in in_flight:
+            task.cancel()
+        if pending is not None:
+            pending[1].cancel()
+        encoder.shutdown(wait=False)
         cap.release()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Simulate a live camera stream.")
     parser.add_argument("--video", required=True, help="Path to source video file")
-    parser.add_argument("--url", default="http://localhost:8000/ingest", help="Server ingestion endpoint")
+    parser.add_argument("--url", default=None, help="Server ingestion endpoint (default: /ingest, or /ingest_batch when batching)")
     parser.add_argument("--fps", type=int, default=10, help="Frames per second to stream")
-    
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Concurrent POSTs allowed before encoding waits")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frames per multipart POST (>1 posts to /ingest_batch)")
+    parser.add_argument("--dedup-threshold", type=int, default=3, help="Skip frames whose dHash differs from the last sent one by fewer bits (0 sends every frame)")
+    parser.add_argument("--max-edge", type=int, default=768, help="Shrink frames so their long side is at most this before encoding (0 keeps full size)")
+    parser.add_argument("--http2", action="store_true", help="Multiplex POSTs as HTTP/2 streams via httpx (server must speak h2)")
+    parser.add_argument("--raw", action="store_true", help="Post over raw sockets, writing headers and JPEGs as one scatter-gather sendmsg (http:// only)")
+    parser.add_argument("--zerocopy", action="store_true", help="Like --raw, with MSG_ZEROCOPY JPEG bodies (Linux)")
+
     args = parser.parse_args()
-    simulate_stream(args.video, args.url, args.fps)
+    url = args.url or ("http://localhost:8000/ingest_batch" if args.batch_size > 1 else "http://localhost:8000/ingest")
+    try:
+        asyncio.run(simulate_stream(args.video, url, args.fps, args.max_in_flight, args.batch_size,
+                                    args.dedup_threshold, args.max_edge, args.http2,
+                                    args.zerocopy, args.raw))
+    except KeyboardInterrupt:
+        print("Streaming stopped.")